@@ -6,6 +6,7 @@ from azure_tennis_api.routes.transcript_routes import transcript_bp
 from azure_tennis_api.routes.search_routes import search_bp
 from azure_tennis_api.routes.chat_routes import chat_bp
 from azure_tennis_api.routes.matches_routes import matches_bp
+from azure_tennis_api.routes.job_routes import jobs_bp
 from azure_tennis_api.config import Config
 from azure_tennis_api.models import db
 
@@ -27,6 +28,7 @@ app.register_blueprint(transcript_bp, url_prefix='/api/transcript')
 app.register_blueprint(search_bp, url_prefix='/api/search')
 app.register_blueprint(chat_bp, url_prefix='/api/chat')
 app.register_blueprint(matches_bp, url_prefix='/api/matches') 
+app.register_blueprint(jobs_bp, url_prefix='/api/jobs')
 
 @app.route('/api/health')
 def health_check():
@@ -37,5 +37,105 @@ class ConfigTemplate:
     USE_BLOB_STORAGE = True
     
     # Application settings
-    MAX_PLAYLIST_VIDEOS = 3
-    CAPTIONS_DIR = os.path.join(os.getcwd(), "captions")
\ No newline at end of file
+    MAX_PLAYLIST_VIDEOS = int(os.getenv('MAX_PLAYLIST_VIDEOS', '500'))
+    CAPTIONS_DIR = os.path.join(os.getcwd(), "captions")
+
+    # Background job queue
+    JOB_POLL_INTERVAL_SECONDS = float(os.getenv('JOB_POLL_INTERVAL_SECONDS', '2'))
+    JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', '600'))
+    # How often a running job renews its lease; must be well under JOB_LEASE_SECONDS
+    JOB_HEARTBEAT_SECONDS = float(os.getenv('JOB_HEARTBEAT_SECONDS', '30'))
+    JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+    JOB_RETRY_DELAY_SECONDS = int(os.getenv('JOB_RETRY_DELAY_SECONDS', '30'))
+
+    # Azure OpenAI deployment quota used to pace transcript cleaning
+    AZURE_OPENAI_RPM = int(os.getenv('AZURE_OPENAI_RPM', '60'))
+    AZURE_OPENAI_TPM = int(os.getenv('AZURE_OPENAI_TPM', '60000'))
+    AZURE_OPENAI_MAX_CONCURRENCY = int(os.getenv('AZURE_OPENAI_MAX_CONCURRENCY', '4'))
+    AZURE_OPENAI_MAX_RETRIES = int(os.getenv('AZURE_OPENAI_MAX_RETRIES', '5'))
+
+    # Token budget of the cleaning deployment, used to size transcript chunks
+    AZURE_OPENAI_CONTEXT_TOKENS = int(os.getenv('AZURE_OPENAI_CONTEXT_TOKENS', '16384'))
+    AZURE_OPENAI_MAX_OUTPUT_TOKENS = int(os.getenv('AZURE_OPENAI_MAX_OUTPUT_TOKENS', '8192'))
+    CLEANING_OUTPUT_RATIO = float(os.getenv('CLEANING_OUTPUT_RATIO', '1.1'))
+
+    # On-disk cache of cleaned transcript chunks
+    LLM_CACHE_DIR = os.getenv('LLM_CACHE_DIR', os.path.join(os.getcwd(), "llm_cache"))
+    LLM_CACHE_MAX_BYTES = int(os.getenv('LLM_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+
+    # Retrieval for chat: transcripts are split into passages and only the best matches are sent
+    PASSAGE_TOKENS = int(os.getenv('PASSAGE_TOKENS', '250'))
+    PASSAGE_OVERLAP_TOKENS = int(os.getenv('PASSAGE_OVERLAP_TOKENS', '50'))
+    CHAT_TOP_K = int(os.getenv('CHAT_TOP_K', '8'))
+    CHAT_CONTEXT_TOKEN_BUDGET = int(os.getenv('CHAT_CONTEXT_TOKEN_BUDGET', '3000'))
+
+    # Azure AI Search passage indexing
+    SEARCH_PASSAGE_TOKENS = int(os.getenv('SEARCH_PASSAGE_TOKENS', '512'))
+    SEARCH_PASSAGE_OVERLAP_TOKENS = int(os.getenv('SEARCH_PASSAGE_OVERLAP_TOKENS', '64'))
+    SEARCH_BATCH_MAX_DOCUMENTS = int(os.getenv('SEARCH_BATCH_MAX_DOCUMENTS', '1000'))
+    SEARCH_BATCH_MAX_BYTES = int(os.getenv('SEARCH_BATCH_MAX_BYTES', str(8 * 1024 * 1024)))
+    SEARCH_BACKFILL_CONCURRENCY = int(os.getenv('SEARCH_BACKFILL_CONCURRENCY', '4'))
+    SEARCH_SCHEMA_TTL_SECONDS = int(os.getenv('SEARCH_SCHEMA_TTL_SECONDS', '3600'))
+    SEARCH_HTTP_POOL_SIZE = int(os.getenv('SEARCH_HTTP_POOL_SIZE', '16'))
+
+    # Search backend: 'azure' for Azure AI Search, 'local' for the in-process inverted index
+    SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', 'azure')
+    LOCAL_SEARCH_INDEX_PATH = os.getenv('LOCAL_SEARCH_INDEX_PATH', os.path.join(os.getcwd(), "search_index", "local_index.pkl"))
+    # Per-video updates are appended to a log next to the index; past this size it is folded into a new snapshot
+    LOCAL_SEARCH_LOG_MAX_BYTES = int(os.getenv('LOCAL_SEARCH_LOG_MAX_BYTES', str(64 * 1024 * 1024)))
+
+    # Passage embeddings for semantic search, stored in a memory-mapped vector file
+    EMBEDDINGS_ENABLED = os.getenv('EMBEDDINGS_ENABLED', 'true').lower() == 'true'
+    EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '256'))
+    VECTOR_STORE_DIR = os.getenv('VECTOR_STORE_DIR', os.path.join(os.getcwd(), "vector_store"))
+
+    # Approximate nearest-neighbour search over the vector store
+    VECTOR_IVF_MIN_ROWS = int(os.getenv('VECTOR_IVF_MIN_ROWS', '20000'))
+    VECTOR_IVF_NPROBE = int(os.getenv('VECTOR_IVF_NPROBE', '8'))
+    VECTOR_RERANK_FACTOR = int(os.getenv('VECTOR_RERANK_FACTOR', '10'))
+
+    # Hybrid search: candidates taken from each retriever before reciprocal rank fusion
+    HYBRID_CANDIDATES = int(os.getenv('HYBRID_CANDIDATES', '50'))
+    HYBRID_RRF_K = int(os.getenv('HYBRID_RRF_K', '60'))
+    # Threads for the vector stage of hybrid queries; set to the number of threads serving requests
+    HYBRID_SEARCH_WORKERS = int(os.getenv('HYBRID_SEARCH_WORKERS', '16'))
+
+    # How often a worker recounts matches to correct drift in the stats counters
+    STATS_RECONCILE_INTERVAL_SECONDS = int(os.getenv('STATS_RECONCILE_INTERVAL_SECONDS', '3600'))
+
+    # YouTube Data API client and metadata cache
+    YOUTUBE_MAX_RETRIES = int(os.getenv('YOUTUBE_MAX_RETRIES', '3'))
+    YOUTUBE_HTTP_POOL_SIZE = int(os.getenv('YOUTUBE_HTTP_POOL_SIZE', '10'))
+    YOUTUBE_REQUEST_TIMEOUT_SECONDS = float(os.getenv('YOUTUBE_REQUEST_TIMEOUT_SECONDS', '10'))
+    YOUTUBE_METADATA_TTL_SECONDS = int(os.getenv('YOUTUBE_METADATA_TTL_SECONDS', str(7 * 24 * 3600)))
+
+    # Transcript downloads: concurrent fetches per process and the per-video time limit.
+    # A fetch that times out keeps its pool slot until it returns; once TRANSCRIPT_FETCH_MAX_STALLED
+    # slots are held that way, new fetches fail fast (and their jobs retry) instead of queueing behind them.
+    TRANSCRIPT_FETCH_CONCURRENCY = int(os.getenv('TRANSCRIPT_FETCH_CONCURRENCY', '8'))
+    TRANSCRIPT_FETCH_TIMEOUT_SECONDS = float(os.getenv('TRANSCRIPT_FETCH_TIMEOUT_SECONDS', '60'))
+    TRANSCRIPT_FETCH_MAX_STALLED = int(os.getenv('TRANSCRIPT_FETCH_MAX_STALLED', '4'))
+
+    # Job threads per worker process, and how often streamed playlist progress polls job state.
+    # Each extract job blocks a thread on its fetch, so keep this at least TRANSCRIPT_FETCH_CONCURRENCY
+    # for a playlist's videos to download in parallel.
+    WORKER_CONCURRENCY = int(os.getenv('WORKER_CONCURRENCY', '8'))
+    JOB_PROGRESS_POLL_SECONDS = float(os.getenv('JOB_PROGRESS_POLL_SECONDS', '1'))
+    # How long a streamed playlist request waits for its jobs before ending with a timeout event
+    PLAYLIST_PROGRESS_TIMEOUT_SECONDS = float(os.getenv('PLAYLIST_PROGRESS_TIMEOUT_SECONDS', '1800'))
+
+    # Transcript blob compression: 'zstd' (gzip if zstandard isn't installed), 'gzip' or 'none'
+    BLOB_COMPRESSION = os.getenv('BLOB_COMPRESSION', 'zstd')
+    BLOB_COMPRESSION_LEVEL = int(os.getenv('BLOB_COMPRESSION_LEVEL', '9'))
+
+    # Local cache of blob transcripts, revalidated with the blob ETag once older than the fresh window
+    TRANSCRIPT_CACHE_DIR = os.getenv('TRANSCRIPT_CACHE_DIR', os.path.join(os.getcwd(), "transcript_cache"))
+    TRANSCRIPT_CACHE_MEMORY_BYTES = int(os.getenv('TRANSCRIPT_CACHE_MEMORY_BYTES', str(64 * 1024 * 1024)))
+    TRANSCRIPT_CACHE_DISK_BYTES = int(os.getenv('TRANSCRIPT_CACHE_DISK_BYTES', str(1024 * 1024 * 1024)))
+    TRANSCRIPT_CACHE_FRESH_SECONDS = float(os.getenv('TRANSCRIPT_CACHE_FRESH_SECONDS', '30'))
+
+    # Transcript store: in-memory LRU over local transcript files
+    TRANSCRIPT_STORE_MEMORY_CHARS = int(os.getenv('TRANSCRIPT_STORE_MEMORY_CHARS', str(64 * 1024 * 1024)))
+
+    # Concurrent requests per process for bulk blob uploads, downloads, deletes and batched store reads
+    BLOB_CONCURRENCY = int(os.getenv('BLOB_CONCURRENCY', '16'))
@@ -0,0 +1,29 @@
+"""Add match pagination indexes
+
+Revision ID: f2a6c8d04b19
+Revises: e91d3a6b5c27
+Create Date: 2025-08-13 16:05:52.118730
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2a6c8d04b19'
+down_revision = 'e91d3a6b5c27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Built concurrently so large matches tables stay writable during the migration
+    with op.get_context().autocommit_block():
+        op.create_index('ix_matches_created_at_id', 'matches', [sa.text('created_at DESC'), sa.text('id DESC')], unique=False, postgresql_concurrently=True)
+        op.create_index('ix_matches_status_created_at_id', 'matches', ['processing_status', sa.text('created_at DESC'), sa.text('id DESC')], unique=False, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_matches_status_created_at_id', table_name='matches', postgresql_concurrently=True)
+        op.drop_index('ix_matches_created_at_id', table_name='matches', postgresql_concurrently=True)
@@ -1,16 +1,34 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
-from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB, TSVECTOR
+from sqlalchemy.orm import deferred
 import enum
 
 db = SQLAlchemy()
 
+# Weighted document for match search. matches_players_text() is an immutable
+# wrapper around array_to_string, created by the migration, so it can be used
+# in the generated column and the trigram index.
+MATCH_SEARCH_VECTOR_SQL = (
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', matches_players_text(players)), 'A') || "
+    "setweight(to_tsvector('english', coalesce(tournament, '')), 'B') || "
+    "setweight(coalesce(transcript_tsv, ''::tsvector), 'D')"
+)
+
 class ProcessingStatus(enum.Enum):
     PENDING = "pending"
     PROCESSING = "processing"
     COMPLETED = "completed"
     FAILED = "failed"
 
+class JobStatus(enum.Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
 class Match(db.Model):
     __tablename__ = 'matches'
     
@@ -24,11 +42,29 @@ class Match(db.Model):
     processing_status = db.Column(db.Enum(ProcessingStatus), default=ProcessingStatus.PENDING)
     transcript_blob_url = db.Column(db.Text)
     azure_search_indexed = db.Column(db.Boolean, default=False)
+    # Kept in step with the transcript files so listings never read them
+    has_raw_transcript = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    has_clean_transcript = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    transcript_length = db.Column(db.Integer)  # characters, clean transcript if any else raw
+    transcript_hash = db.Column(db.String(64))  # sha256 of the same transcript
+    # Azure AI Search keys of the passages last indexed, so re-indexing can diff without querying the index
+    search_passage_keys = deferred(db.Column(ARRAY(db.String)))
+    # Lexemes of the transcript without positions, and the generated search document; never needed in listings
+    transcript_tsv = deferred(db.Column(TSVECTOR))
+    search_vector = deferred(db.Column(TSVECTOR, db.Computed(MATCH_SEARCH_VECTOR_SQL, persisted=True)))
     duration_seconds = db.Column(db.Integer)
     error_message = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Keyset pagination walks (created_at, id) newest first, with or without a status filter
+    __table_args__ = (
+        db.Index('ix_matches_created_at_id', created_at.desc(), id.desc()),
+        db.Index('ix_matches_status_created_at_id', processing_status, created_at.desc(), id.desc()),
+        db.Index('ix_matches_search_vector', 'search_vector', postgresql_using='gin'),
+        db.Index('ix_matches_players_trgm', db.text('matches_players_text(players) gin_trgm_ops'), postgresql_using='gin'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -40,12 +76,47 @@ class Match(db.Model):
             'surface': self.surface,
             'processing_status': self.processing_status.value if self.processing_status else None,
             'azure_search_indexed': self.azure_search_indexed,
+            'has_raw_transcript': self.has_raw_transcript,
+            'has_clean_transcript': self.has_clean_transcript,
+            'transcript_length': self.transcript_length,
+            'transcript_hash': self.transcript_hash,
             'duration_seconds': self.duration_seconds,
             'created_at': self.created_at.isoformat(),
             'updated_at': self.updated_at.isoformat(),
             'error_message': self.error_message
         }
 
+class MatchStat(db.Model):
+    """Running match counters ('total', one per processing status, 'indexed') so stats needn't scan matches"""
+    __tablename__ = 'match_stats'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.BigInteger, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class VideoMetadata(db.Model):
+    """Cached YouTube metadata, refetched once older than YOUTUBE_METADATA_TTL_SECONDS"""
+    __tablename__ = 'video_metadata'
+    
+    video_id = db.Column(db.String(50), primary_key=True)
+    title = db.Column(db.String(500))
+    duration_seconds = db.Column(db.Integer)
+    channel_title = db.Column(db.String(200))
+    published_at = db.Column(db.DateTime)
+    found = db.Column(db.Boolean, nullable=False, default=True)  # False when YouTube has no such video
+    fetched_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'video_id': self.video_id,
+            'title': self.title,
+            'duration_seconds': self.duration_seconds,
+            'channel_title': self.channel_title,
+            'published_at': self.published_at.isoformat() if self.published_at else None,
+            'found': self.found,
+            'fetched_at': self.fetched_at.isoformat()
+        }
+
 class AnalysisSession(db.Model):
     __tablename__ = 'analysis_sessions'
     
@@ -54,6 +125,7 @@ class AnalysisSession(db.Model):
     ai_response = db.Column(db.Text)
     source_match_ids = db.Column(ARRAY(db.Integer))  
     processing_time_ms = db.Column(db.Integer)
+    time_to_first_token_ms = db.Column(db.Integer)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def to_dict(self):
@@ -63,5 +135,51 @@ class AnalysisSession(db.Model):
             'ai_response': self.ai_response,
             'source_match_ids': self.source_match_ids,
             'processing_time_ms': self.processing_time_ms,
+            'time_to_first_token_ms': self.time_to_first_token_ms,
             'created_at': self.created_at.isoformat()
+        }
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    job_type = db.Column(db.String(50), nullable=False)  # extract, clean, index
+    video_id = db.Column(db.String(50), index=True)
+    payload = db.Column(JSONB)
+    status = db.Column(db.Enum(JobStatus), default=JobStatus.QUEUED, nullable=False)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    max_attempts = db.Column(db.Integer, default=3, nullable=False)
+    cancel_requested = db.Column(db.Boolean, default=False, nullable=False)
+    result = db.Column(JSONB)
+    error_message = db.Column(db.Text)
+    locked_by = db.Column(db.String(200))
+    locked_at = db.Column(db.DateTime)
+    run_after = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Workers poll on (status, run_after) ordered by id
+    __table_args__ = (
+        db.Index('ix_jobs_status_run_after', 'status', 'run_after', 'id'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'job_type': self.job_type,
+            'video_id': self.video_id,
+            'payload': self.payload,
+            'status': self.status.value if self.status else None,
+            'attempts': self.attempts,
+            'max_attempts': self.max_attempts,
+            'cancel_requested': self.cancel_requested,
+            'result': self.result,
+            'error_message': self.error_message,
+            'locked_by': self.locked_by,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
\ No newline at end of file
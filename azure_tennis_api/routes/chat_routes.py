@@ -1,13 +1,90 @@
-from flask import Blueprint, request, jsonify
-import os
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+import json
 import time
 from azure_tennis_api.services.search_service import SearchService 
-from azure_tennis_api.services.chat_service import chat_with_context
+from azure_tennis_api.services.chat_service import chat_with_context, chat_with_context_stream
+from azure_tennis_api.services.retrieval_service import passage_retriever
+from azure_tennis_api.services.processing_service import transcript_store
 from azure_tennis_api.config import Config
 from azure_tennis_api.models import db, AnalysisSession
 
 chat_bp = Blueprint('chat', __name__)
 
+# Upper bound on passages per answer, whatever the client asks for
+MAX_TOP_K = 50
+
+def parse_retrieval_option(data, name, default, upper):
+    """Client-sent integer option clamped to 1..upper; ValueError if it isn't an integer"""
+    value = data.get(name)
+    if value is None:
+        return default
+    if isinstance(value, bool):
+        raise ValueError(f"{name} must be an integer")
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be an integer")
+    return max(1, min(value, upper))
+
+def parse_retrieval_options(data):
+    top_k = parse_retrieval_option(data, 'top_k', Config.CHAT_TOP_K, MAX_TOP_K)
+    token_budget = parse_retrieval_option(data, 'token_budget', Config.CHAT_CONTEXT_TOKEN_BUDGET, Config.AZURE_OPENAI_CONTEXT_TOKENS)
+    return top_k, token_budget
+
+def retrieve_context(video_id, query, top_k, token_budget):
+    """Build the chat context from the passages most relevant to the question"""
+    transcript_stat = transcript_store.stat(video_id, is_clean=True)
+    
+    if transcript_stat is None:
+        return None, []
+    
+    def load_content():
+        transcript_result = transcript_store.get(video_id, is_clean=True)
+        if not transcript_result['success']:
+            raise FileNotFoundError(transcript_result['message'])
+        return transcript_result['content']
+    
+    passages = passage_retriever.retrieve(
+        video_id,
+        query,
+        load_content,
+        version=transcript_stat['version'],
+        top_k=top_k,
+        token_budget=token_budget
+    )
+    
+    context = f"From tennis match (Video ID: {video_id}):\n" + "\n\n".join(
+        f"[Passage {passage['index'] + 1}]\n{passage['content']}" for passage in passages
+    )
+    
+    return context, passages
+
+def build_sources(video_id, passages):
+    return [{
+        "title": f"Tennis Match ({video_id})",
+        "video_id": video_id,
+        "passages": [passage['index'] for passage in passages]
+    }]
+
+def save_analysis_session(query, ai_response, processing_time_ms, time_to_first_token_ms=None):
+    try:
+        analysis_session = AnalysisSession(
+            question=query,
+            ai_response=ai_response,
+            source_match_ids=[],  
+            processing_time_ms=processing_time_ms,
+            time_to_first_token_ms=time_to_first_token_ms
+        )
+        db.session.add(analysis_session)
+        db.session.commit()
+        return analysis_session.id
+    except Exception:
+        db.session.rollback()
+        return None
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 @chat_bp.route('/query', methods=['POST'])
 def chat_query():
     """Chat with AI using specified transcript"""
@@ -22,45 +99,35 @@ def chat_query():
     if not video_id:
         return jsonify({"success": False, "message": "No video ID provided"}), 400
     
+    try:
+        top_k, token_budget = parse_retrieval_options(data)
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    
     start_time = time.time()
     
     try:
-        # Read transcript for the specified video
-        clean_file_path = os.path.join(Config.CAPTIONS_DIR, f"{video_id}_clean.txt")
+        # Retrieve only the passages relevant to this question
+        context, passages = retrieve_context(video_id, query, top_k, token_budget)
         
-        if not os.path.exists(clean_file_path):
+        if context is None:
             return jsonify({
                 "success": False,
                 "message": f"Transcript not found for video: {video_id}"
             }), 404
         
-        with open(clean_file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        context = f"From tennis match (Video ID: {video_id}):\n{content}"
-        
         # Get AI response using the context
         ai_response = chat_with_context(query, context, conversation_history)
         
         processing_time_ms = int((time.time() - start_time) * 1000)
         
-        try:
-            analysis_session = AnalysisSession(
-                question=query,
-                ai_response=ai_response,
-                source_match_ids=[],  
-                processing_time_ms=processing_time_ms
-            )
-            db.session.add(analysis_session)
-            db.session.commit()
-        except Exception:
-            pass
+        save_analysis_session(query, ai_response, processing_time_ms)
         
         # Return response
         return jsonify({
             "success": True,
             "response": ai_response,
-            "sources": [{"title": f"Tennis Match ({video_id})", "video_id": video_id}],
+            "sources": build_sources(video_id, passages),
             "processing_time_ms": processing_time_ms
         })
         
@@ -72,6 +139,81 @@ def analyze_question():
     """Alternative endpoint for frontend compatibility"""
     return chat_query()
 
+@chat_bp.route('/query/stream', methods=['POST'])
+def chat_query_stream():
+    """Chat with AI, streaming the answer as server-sent events"""
+    data = request.get_json()
+    query = data.get('query')
+    video_id = data.get('video_id')
+    conversation_history = data.get('conversation_history', [])
+    
+    if not query:
+        return jsonify({"success": False, "message": "No query provided"}), 400
+    
+    if not video_id:
+        return jsonify({"success": False, "message": "No video ID provided"}), 400
+    
+    try:
+        top_k, token_budget = parse_retrieval_options(data)
+    except ValueError as e:
+        return jsonify({"success": False, "message": str(e)}), 400
+    
+    start_time = time.time()
+    
+    try:
+        context, passages = retrieve_context(video_id, query, top_k, token_budget)
+    except Exception as e:
+        return jsonify({"success": False, "message": f"Error: {str(e)}"}), 500
+    
+    if context is None:
+        return jsonify({
+            "success": False,
+            "message": f"Transcript not found for video: {video_id}"
+        }), 404
+    
+    def generate():
+        parts = []
+        time_to_first_token_ms = None
+        
+        yield sse_event("sources", {"sources": build_sources(video_id, passages)})
+        
+        try:
+            for delta in chat_with_context_stream(query, context, conversation_history):
+                if time_to_first_token_ms is None:
+                    time_to_first_token_ms = int((time.time() - start_time) * 1000)
+                parts.append(delta)
+                yield sse_event("token", {"delta": delta})
+        except Exception as e:
+            print(f"Error in streamed chat completion: {str(e)}")
+            yield sse_event("error", {"success": False, "message": f"Error: {str(e)}"})
+            return
+        
+        ai_response = ''.join(parts).strip()
+        processing_time_ms = int((time.time() - start_time) * 1000)
+        session_id = save_analysis_session(query, ai_response, processing_time_ms, time_to_first_token_ms)
+        
+        yield sse_event("done", {
+            "success": True,
+            "session_id": session_id,
+            "processing_time_ms": processing_time_ms,
+            "time_to_first_token_ms": time_to_first_token_ms
+        })
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={
+            'Cache-Control': 'no-cache',
+            # Stop reverse proxies from buffering the stream
+            'X-Accel-Buffering': 'no'
+        }
+    )
+
+@chat_bp.route('/analyze/stream', methods=['POST'])
+def analyze_question_stream():
+    """Streaming counterpart of /analyze"""
+    return chat_query_stream()
+
 @chat_bp.route('/history', methods=['GET'])
 def get_analysis_history():
     """Get recent analysis sessions"""
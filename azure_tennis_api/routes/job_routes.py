@@ -0,0 +1,73 @@
+from flask import Blueprint, request, jsonify
+from azure_tennis_api.models import Job, JobStatus
+from azure_tennis_api.services.job_queue_service import get_job, cancel_job
+
+jobs_bp = Blueprint('jobs', __name__)
+
+MAX_PAGE_SIZE = 200
+
+@jobs_bp.route('/', methods=['GET'])
+def list_jobs():
+    """List recent jobs, optionally filtered by status, type or video"""
+    try:
+        status_filter = request.args.get('status')
+        job_type = request.args.get('type')
+        video_id = request.args.get('video_id')
+        limit = max(1, min(request.args.get('limit', 50, type=int), MAX_PAGE_SIZE))
+        
+        query = Job.query
+        
+        if status_filter:
+            try:
+                query = query.filter(Job.status == JobStatus(status_filter))
+            except ValueError:
+                return jsonify({"success": False, "message": f"Unknown job status: {status_filter}"}), 400
+        if job_type:
+            query = query.filter(Job.job_type == job_type)
+        if video_id:
+            query = query.filter(Job.video_id == video_id)
+        
+        jobs = query.order_by(Job.id.desc()).limit(limit).all()
+        
+        return jsonify({
+            "success": True,
+            "jobs": [job.to_dict() for job in jobs]
+        })
+        
+    except Exception as e:
+        return jsonify({"success": False, "message": f"Failed to list jobs: {str(e)}"}), 500
+
+@jobs_bp.route('/<int:job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """Get the status and result of a job"""
+    try:
+        job = get_job(job_id)
+        
+        if not job:
+            return jsonify({"success": False, "message": "Job not found"}), 404
+        
+        return jsonify({
+            "success": True,
+            "job": job.to_dict()
+        })
+        
+    except Exception as e:
+        return jsonify({"success": False, "message": f"Failed to fetch job: {str(e)}"}), 500
+
+@jobs_bp.route('/<int:job_id>/cancel', methods=['POST'])
+def cancel_job_route(job_id):
+    """Cancel a queued job or ask its worker to stop"""
+    try:
+        job = cancel_job(job_id)
+        
+        if not job:
+            return jsonify({"success": False, "message": "Job not found"}), 404
+        
+        return jsonify({
+            "success": True,
+            "message": "Job cancelled" if job.status == JobStatus.CANCELLED else "Cancellation requested",
+            "job": job.to_dict()
+        })
+        
+    except Exception as e:
+        return jsonify({"success": False, "message": f"Failed to cancel job: {str(e)}"}), 500
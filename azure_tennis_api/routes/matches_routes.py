@@ -1,82 +1,56 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+import base64
+import json
 import os
 import re
 from datetime import datetime
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from azure_tennis_api.config import Config
 from azure_tennis_api.models import db, Match, ProcessingStatus
-from azure_tennis_api.services.search_service import SearchService
-from azure_tennis_api.services.youtube_service import get_video_title
+from azure_tennis_api.services.search_service import get_search_service
+from azure_tennis_api.services.youtube_service import get_video_metadata
+from azure_tennis_api.services.job_queue_service import enqueue_job
+from azure_tennis_api.services.embedding_service import get_vector_store
+from azure_tennis_api.services.processing_service import follow_up_stages, read_transcript_metadata, transcript_store
+from azure_tennis_api.services.match_stats_service import (
+    adjust_counters,
+    get_match_stats,
+    record_match_removed,
+    record_status_change,
+    status_counter
+)
 
 # Create blueprint
 matches_bp = Blueprint('matches', __name__)
 
-# Helper methods
-def get_transcript_info(video_id):
-    """Get transcript file paths and check if they exist"""
-    captions_dir = Config.CAPTIONS_DIR
-    raw_path = os.path.join(captions_dir, f"{video_id}.txt")
-    clean_path = os.path.join(captions_dir, f"{video_id}_clean.txt")
-    
-    has_raw = os.path.exists(raw_path)
-    has_clean = os.path.exists(clean_path)
-    
-    # Get transcript length
-    transcript_length = None
-    if has_clean:
-        try:
-            with open(clean_path, 'r', encoding='utf-8') as f:
-                transcript_length = len(f.read())
-        except:
-            pass
-    elif has_raw:
-        try:
-            with open(raw_path, 'r', encoding='utf-8') as f:
-                transcript_length = len(f.read())
-        except:
-            pass
-    
-    return {
-        'raw_path': raw_path,
-        'clean_path': clean_path,
-        'has_raw': has_raw,
-        'has_clean': has_clean,
-        'length': transcript_length
-    }
+MAX_PAGE_SIZE = 200
+# Transcript files per title lookup and INSERT in /migrate
+MIGRATE_CHUNK_SIZE = 100
 
-def get_actual_status(match, transcript_info):
-    """Get the actual status based on DB status and file existence"""
+# Helper methods
+def get_actual_status(match):
+    """Get the actual status based on DB status and recorded transcript availability"""
     db_status = match.processing_status.value if match.processing_status else 'pending'
     
-    if db_status == 'completed' and not (transcript_info['has_raw'] and transcript_info['has_clean']):
+    if db_status == 'completed' and not (match.has_raw_transcript and match.has_clean_transcript):
         return 'failed'
     return db_status
 
 def build_match_data(match, include_content=False):
-    """Build standardized match data dictionary"""
-    transcript_info = get_transcript_info(match.video_id)
-    actual_status = get_actual_status(match, transcript_info)
-    
-    # Get transcript content if requested
-    transcript_content = None
-    if include_content and transcript_info['has_clean']:
-        try:
-            with open(transcript_info['clean_path'], 'r', encoding='utf-8') as f:
-                transcript_content = f.read()
-        except:
-            pass
-    
+    """Build standardized match data dictionary from the match row alone"""
     match_data = {
         'id': match.id,
         'video_id': match.video_id,
         'title': match.title or f"Video {match.video_id}",
         'duration': match.duration_seconds,
         'processed_at': match.created_at.isoformat() if match.created_at else None,
-        'status': actual_status,
+        'status': get_actual_status(match),
         'thumbnail_url': f"https://img.youtube.com/vi/{match.video_id}/mqdefault.jpg",
         'players_detected': match.players if match.players else [],
-        'transcript_length': transcript_info['length'],
-        'has_raw_transcript': transcript_info['has_raw'],
-        'has_clean_transcript': transcript_info['has_clean'],
+        'transcript_length': match.transcript_length,
+        'transcript_hash': match.transcript_hash,
+        'has_raw_transcript': match.has_raw_transcript,
+        'has_clean_transcript': match.has_clean_transcript,
         'azure_search_indexed': match.azure_search_indexed,
         'tournament': match.tournament,
         'surface': match.surface,
@@ -84,11 +58,56 @@ def build_match_data(match, include_content=False):
         'error_message': match.error_message
     }
     
+    # Only the single-match view ever reads a transcript body
     if include_content:
+        transcript_content = None
+        if match.has_clean_transcript:
+            transcript_content = transcript_store.get(match.video_id, is_clean=True).get('content')
         match_data['transcript_content'] = transcript_content
     
     return match_data
 
+def remove_match_data(video_ids):
+    """Remove transcripts, blobs and index entries of matches whose rows are already deleted.
+
+    Runs after the commit, so row locks aren't held across network calls
+    and a failed commit never leaves rows whose transcripts are gone. A
+    failure here only leaves orphaned files behind, which are logged.
+    """
+    deleted = {"deleted_files": [], "failed_blobs": []}
+    
+    try:
+        deleted = transcript_store.delete_many(video_ids)
+    except Exception as e:
+        print(f"Warning: Failed to delete transcripts of {len(video_ids)} deleted matches: {str(e)}")
+    
+    try:
+        if Config.SEARCH_BACKEND == 'local':
+            get_search_service().remove_transcripts(video_ids)
+        
+        if Config.EMBEDDINGS_ENABLED:
+            get_vector_store().remove_videos(video_ids)
+    except Exception as e:
+        print(f"Warning: Failed to remove {len(video_ids)} deleted matches from the indexes: {str(e)}")
+    
+    return deleted
+
+def encode_cursor(match):
+    """Opaque token for the position after this match in (created_at, id) order"""
+    payload = json.dumps([match.created_at.isoformat(), match.id])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, match_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.fromisoformat(created_at), int(match_id)
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+def ndjson_line(data):
+    return json.dumps(data) + "\n"
+
 def handle_error(operation, error, rollback=False):
     """Standard error handling"""
     if rollback:
@@ -163,86 +182,105 @@ def extract_tournament_from_title(title):
 # Routes
 @matches_bp.route('/migrate', methods=['POST'])
 def migrate_existing_transcripts():
-    """Create Match records for existing transcript files"""
-    try:
-        captions_dir = Config.CAPTIONS_DIR
-        
-        if not os.path.exists(captions_dir):
-            return jsonify({
-                "success": False,
-                "message": "Captions directory not found"
-            })
-        
-        # Get all transcript files (excluding _clean.txt files to avoid duplicates)
-        transcript_files = [f for f in os.listdir(captions_dir) if f.endswith('.txt') and not f.endswith('_clean.txt')]
-        
-        created_matches = []
-        skipped_matches = []
-        errors = []
+    """Create Match records for existing transcript files, streaming progress as NDJSON"""
+    captions_dir = Config.CAPTIONS_DIR
+    
+    if not os.path.exists(captions_dir):
+        return jsonify({
+            "success": False,
+            "message": "Captions directory not found"
+        })
+    
+    # Get all transcript files (excluding _clean.txt files to avoid duplicates)
+    transcript_files = [f for f in os.listdir(captions_dir) if f.endswith('.txt') and not f.endswith('_clean.txt')]
+    video_ids = [filename[:-len('.txt')] for filename in transcript_files]
+    
+    def generate():
+        summary = {"total_files": len(video_ids), "created": 0, "skipped": 0, "errors": 0}
         
-        for filename in transcript_files:
-            try:
-                video_id = filename.replace('.txt', '')
-                
-                if Match.query.filter_by(video_id=video_id).first():
-                    skipped_matches.append(f"{video_id} - already exists")
-                    continue
+        try:
+            existing = set()
+            for start in range(0, len(video_ids), MIGRATE_CHUNK_SIZE * 10):
+                batch = video_ids[start:start + MIGRATE_CHUNK_SIZE * 10]
+                existing.update(video_id for (video_id,) in db.session.query(Match.video_id).filter(Match.video_id.in_(batch)))
+            
+            new_video_ids = [video_id for video_id in video_ids if video_id not in existing]
+            summary["skipped"] = len(existing)
+            yield ndjson_line({"event": "start", "total_files": len(video_ids), "existing": len(existing), "to_create": len(new_video_ids)})
+            
+            for start in range(0, len(new_video_ids), MIGRATE_CHUNK_SIZE):
+                chunk = new_video_ids[start:start + MIGRATE_CHUNK_SIZE]
                 
                 try:
-                    title = get_video_title(video_id)
-                except:
-                    title = f"Tennis Match {video_id}"
-                
-                players = extract_players_from_title(title)
-                tournament = extract_tournament_from_title(title)
+                    video_metadata = get_video_metadata(chunk)
+                    transcripts_metadata = read_transcript_metadata(chunk)
+                    now = datetime.utcnow()
+                    rows = []
+                    for video_id in chunk:
+                        metadata = video_metadata.get(video_id) or {}
+                        title = metadata.get('title') or f"Tennis Match {video_id}"
+                        transcript_metadata = transcripts_metadata[video_id]
+                        rows.append({
+                            "video_id": video_id,
+                            "title": title,
+                            "players": extract_players_from_title(title),
+                            "tournament": extract_tournament_from_title(title),
+                            "duration_seconds": metadata.get('duration_seconds'),
+                            "processing_status": ProcessingStatus.COMPLETED if transcript_metadata['has_clean_transcript'] else ProcessingStatus.PROCESSING,
+                            "azure_search_indexed": False,
+                            "created_at": now,
+                            "updated_at": now,
+                            **transcript_metadata
+                        })
+                    
+                    # One multi-row INSERT per chunk; rows created concurrently elsewhere are left alone
+                    inserted = db.session.execute(
+                        pg_insert(Match).values(rows)
+                        .on_conflict_do_nothing(index_elements=['video_id'])
+                        .returning(Match.processing_status)
+                    ).scalars().all()
+                    
+                    deltas = {'total': len(inserted)}
+                    for status in inserted:
+                        deltas[status.value] = deltas.get(status.value, 0) + 1
+                    adjust_counters(deltas)
+                    db.session.commit()
+                    
+                    summary["created"] += len(inserted)
+                    summary["skipped"] += len(chunk) - len(inserted)
+                    yield ndjson_line({"event": "progress", "processed": start + len(chunk), "created": summary["created"]})
                 
-                transcript_info = get_transcript_info(video_id)
-                status = ProcessingStatus.COMPLETED if transcript_info['has_clean'] else ProcessingStatus.PROCESSING
-                
-                new_match = Match(
-                    video_id=video_id,
-                    title=title,
-                    players=players,
-                    tournament=tournament,
-                    processing_status=status,
-                    created_at=datetime.utcnow(),
-                    updated_at=datetime.utcnow()
-                )
-                
-                db.session.add(new_match)
-                created_matches.append(f"{video_id} - {title}")
-                
-            except Exception as e:
-                errors.append(f"{filename}: {str(e)}")
-        
-        db.session.commit()
-        
-        return jsonify({
-            "success": True,
-            "message": f"Migration completed: {len(created_matches)} matches created",
-            "created_matches": created_matches,
-            "skipped_matches": skipped_matches,
-            "errors": errors,
-            "summary": {
-                "total_files": len(transcript_files),
-                "created": len(created_matches),
-                "skipped": len(skipped_matches),
-                "errors": len(errors)
-            }
-        })
+                except Exception as e:
+                    db.session.rollback()
+                    summary["errors"] += len(chunk)
+                    print(f"Error migrating transcripts {chunk[0]}..{chunk[-1]}: {str(e)}")
+                    yield ndjson_line({"event": "error", "video_ids": chunk, "message": str(e)})
+            
+            yield ndjson_line({
+                "event": "done",
+                "success": True,
+                "message": f"Migration completed: {summary['created']} matches created",
+                "summary": summary
+            })
         
-    except Exception as e:
-        return handle_error("migrate transcripts", e, rollback=True)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error migrating transcripts: {str(e)}")
+            yield ndjson_line({"event": "done", "success": False, "message": f"Failed to migrate transcripts: {str(e)}", "summary": summary})
+    
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson', headers={'X-Accel-Buffering': 'no'})
 
 @matches_bp.route('/', methods=['GET'])
 def get_all_matches():
-    """Get all processed matches with optional status filter"""
+    """Get processed matches newest first, a page at a time via an opaque cursor"""
     try:
         status_filter = request.args.get('status')
-        limit = request.args.get('limit', 50, type=int)
-        offset = request.args.get('offset', 0, type=int)
+        limit = max(1, min(request.args.get('limit', 50, type=int), MAX_PAGE_SIZE))
+        cursor = request.args.get('cursor')
+        count_mode = request.args.get('count', 'estimate')
         
         query = Match.query
+        status = None
         
         if status_filter and status_filter != 'all':
             status_mapping = {
@@ -252,11 +290,33 @@ def get_all_matches():
                 'pending': ProcessingStatus.PENDING
             }
             if status_filter in status_mapping:
-                query = query.filter(Match.processing_status == status_mapping[status_filter])
-        
-        query = query.order_by(Match.created_at.desc())
-        total_count = query.count()
-        matches = query.offset(offset).limit(limit).all()
+                status = status_mapping[status_filter]
+                query = query.filter(Match.processing_status == status)
+        
+        if count_mode == 'exact':
+            total_count = query.count()
+        elif count_mode == 'estimate':
+            # Maintained counters, so this stays constant time however deep the page
+            stats = get_match_stats()
+            total_count = stats[status.value] if status else stats['total']
+        else:
+            total_count = None
+        
+        if cursor:
+            try:
+                cursor_created_at, cursor_id = decode_cursor(cursor)
+            except ValueError:
+                return jsonify({
+                    'success': False,
+                    'message': 'Invalid cursor'
+                }), 400
+            # Row comparison lets Postgres seek straight to the page in the index
+            query = query.filter(db.tuple_(Match.created_at, Match.id) < db.tuple_(cursor_created_at, cursor_id))
+        
+        # One extra row tells us whether another page exists without counting
+        matches = query.order_by(Match.created_at.desc(), Match.id.desc()).limit(limit + 1).all()
+        has_more = len(matches) > limit
+        matches = matches[:limit]
         
         # Use helper method to build match data
         matches_data = [build_match_data(match) for match in matches]
@@ -266,8 +326,8 @@ def get_all_matches():
             'matches': matches_data,
             'total': total_count,
             'limit': limit,
-            'offset': offset,
-            'has_more': (offset + limit) < total_count
+            'next_cursor': encode_cursor(matches[-1]) if has_more else None,
+            'has_more': has_more
         })
         
     except Exception as e:
@@ -300,7 +360,8 @@ def get_match_by_id(match_id):
 def delete_match(match_id):
     """Delete a processed match and its associated files"""
     try:
-        match = Match.query.get(match_id)
+        # Row lock so the counters are adjusted from the status being deleted
+        match = Match.query.filter_by(id=match_id).with_for_update().populate_existing().first()
         
         if not match:
             return jsonify({
@@ -308,34 +369,70 @@ def delete_match(match_id):
                 'message': 'Match not found'
             }), 404
         
-        transcript_info = get_transcript_info(match.video_id)
-        
-        deleted_files = []
-        for file_path in [transcript_info['raw_path'], transcript_info['clean_path']]:
-            if os.path.exists(file_path):
-                try:
-                    os.remove(file_path)
-                    deleted_files.append(file_path)
-                except Exception as e:
-                    print(f"Warning: Failed to delete file {file_path}: {e}")
-        
+        video_id = match.video_id
+        record_match_removed(match.processing_status, match.azure_search_indexed)
         db.session.delete(match)
         db.session.commit()
         
+        deleted = remove_match_data([video_id])
+        
         return jsonify({
             'success': True,
             'message': 'Match deleted successfully',
-            'deleted_files': deleted_files
+            'deleted_files': deleted['deleted_files'],
+            'failed_blobs': deleted['failed_blobs']
         })
         
     except Exception as e:
         return handle_error("delete match", e, rollback=True)
 
+@matches_bp.route('/delete', methods=['POST'])
+def delete_matches():
+    """Delete many matches and their files, with blob deletes sent as concurrent batches"""
+    try:
+        data = request.get_json(silent=True) or {}
+        match_ids = data.get('match_ids') or []
+        
+        if not isinstance(match_ids, list) or not match_ids:
+            return jsonify({
+                'success': False,
+                'message': 'match_ids must be a non-empty list'
+            }), 400
+        
+        matches = db.session.query(
+            Match.id, Match.video_id, Match.processing_status, Match.azure_search_indexed
+        ).filter(Match.id.in_(match_ids)).with_for_update().all()
+        video_ids = [match.video_id for match in matches]
+        
+        deltas = {'total': -len(matches), 'indexed': -sum(1 for match in matches if match.azure_search_indexed)}
+        for match in matches:
+            name = status_counter(match.processing_status)
+            deltas[name] = deltas.get(name, 0) - 1
+        adjust_counters(deltas)
+        
+        Match.query.filter(Match.id.in_([match.id for match in matches])).delete(synchronize_session=False)
+        db.session.commit()
+        
+        deleted = remove_match_data(video_ids)
+        
+        return jsonify({
+            'success': True,
+            'message': f'Deleted {len(matches)} matches',
+            'deleted_matches': len(matches),
+            'not_found': len(set(match_ids)) - len(matches),
+            'deleted_files': len(deleted['deleted_files']),
+            'failed_blobs': deleted['failed_blobs']
+        })
+        
+    except Exception as e:
+        return handle_error("delete matches", e, rollback=True)
+
 @matches_bp.route('/<match_id>/reprocess', methods=['POST'])
 def reprocess_match(match_id):
     """Reprocess a failed match"""
     try:
-        match = Match.query.get(match_id)
+        # Row lock, as in update_match_status, so the status change is counted once
+        match = Match.query.filter_by(id=match_id).with_for_update().populate_existing().first()
         
         if not match:
             return jsonify({
@@ -343,27 +440,37 @@ def reprocess_match(match_id):
                 'message': 'Match not found'
             }), 404
         
+        record_status_change(match.processing_status, ProcessingStatus.PROCESSING)
         match.processing_status = ProcessingStatus.PROCESSING
         match.updated_at = datetime.utcnow()
         match.error_message = None
         
         db.session.commit()
         
+        # Clean again, then re-index once the clean transcript is written
+        then = follow_up_stages('index')
+        if match.has_raw_transcript:
+            job = enqueue_job('clean', match.video_id, {'then': then})
+        else:
+            # Nothing to clean yet, so extract first
+            job = enqueue_job('extract', match.video_id, {'title': match.title, 'then': [['clean', then]]})
+        
         return jsonify({
             'success': True,
             'message': 'Match reprocessing started',
-            'job_id': f'reprocess_{match_id}_{datetime.utcnow().strftime("%Y%m%d_%H%M%S")}'
-        })
+            'job_id': job.id,
+            'status': job.status.value
+        }), 202
         
     except Exception as e:
         return handle_error("reprocess match", e, rollback=True)
 
 @matches_bp.route('/search', methods=['GET'])
 def search_matches():
-    """Search matches by title, video ID, or players"""
+    """Search matches by title, players, tournament and transcript text, best matches first"""
     try:
         query = request.args.get('q', '').strip()
-        limit = request.args.get('limit', 20, type=int)
+        limit = max(1, min(request.args.get('limit', 20, type=int), MAX_PAGE_SIZE))
         
         if not query:
             return jsonify({
@@ -371,13 +478,18 @@ def search_matches():
                 'message': 'Search query is required'
             }), 400
         
-        search_pattern = f'%{query}%'
+        # Full text via the GIN index on search_vector, misspelt player names via the trigram index
+        ts_query = db.func.websearch_to_tsquery('english', query)
+        players_text = db.func.matches_players_text(Match.players)
+        rank = db.func.ts_rank(Match.search_vector, ts_query) + db.func.word_similarity(query, players_text)
+        
         matches = Match.query.filter(
             db.or_(
-                Match.title.ilike(search_pattern),
-                Match.video_id.ilike(search_pattern)
+                Match.search_vector.op('@@')(ts_query),
+                db.literal(query).op('<%')(players_text),
+                Match.video_id == query
             )
-        ).order_by(Match.created_at.desc()).limit(limit).all()
+        ).order_by(rank.desc(), Match.created_at.desc()).limit(limit).all()
         
         # Use helper method to build match data
         matches_data = [build_match_data(match) for match in matches]
@@ -394,25 +506,21 @@ def search_matches():
 
 @matches_bp.route('/stats', methods=['GET'])
 def get_matches_stats():
-    """Get statistics about processed matches"""
+    """Get statistics about processed matches from the maintained counters"""
     try:
-        total_matches = Match.query.count()
-        
-        completed_count = Match.query.filter(Match.processing_status == ProcessingStatus.COMPLETED).count()
-        processing_count = Match.query.filter(Match.processing_status == ProcessingStatus.PROCESSING).count()
-        failed_count = Match.query.filter(Match.processing_status == ProcessingStatus.FAILED).count()
-        pending_count = Match.query.filter(Match.processing_status == ProcessingStatus.PENDING).count()
-        indexed_count = Match.query.filter(Match.azure_search_indexed == True).count()
+        stats = get_match_stats()
+        total_matches = stats['total']
+        completed_count = stats['completed']
         
         return jsonify({
             'success': True,
             'stats': {
                 'total_matches': total_matches,
                 'completed': completed_count,
-                'processing': processing_count,
-                'failed': failed_count,
-                'pending': pending_count,
-                'indexed': indexed_count,
+                'processing': stats['processing'],
+                'failed': stats['failed'],
+                'pending': stats['pending'],
+                'indexed': stats['indexed'],
                 'success_rate': round((completed_count / total_matches * 100) if total_matches > 0 else 0, 2)
             }
         })
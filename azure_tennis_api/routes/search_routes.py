@@ -1,85 +1,45 @@
 from flask import Blueprint, request, jsonify
-import os
-from datetime import datetime
-from azure_tennis_api.config import Config
-from azure_tennis_api.services.search_service import SearchService
-from azure_tennis_api.services.blob_storage_service import BlobStorageService    
-from azure_tennis_api.models import db, Match 
+from azure_tennis_api.services.search_service import get_search_service
+from azure_tennis_api.services.job_queue_service import enqueue_job
+from azure_tennis_api.services.embedding_service import semantic_search
+from azure_tennis_api.services.hybrid_search_service import hybrid_search
 
 search_bp = Blueprint('search', __name__)
 
-def get_video_title(video_id):
+@search_bp.route('/index/<video_id>', methods=['POST'])
+def index_transcript(video_id):
+    """Queue indexing of a clean transcript in Azure AI Search"""
     try:
-        match = Match.query.filter_by(video_id=video_id).first()
-        if match and match.title:
-            return match.title
-        else:
-            return f"Video {video_id}"
+        job = enqueue_job('index', video_id)
+        
+        return jsonify({
+            "success": True,
+            "message": f"✅ Queued indexing for: {video_id}",
+            "video_id": video_id,
+            "job_id": job.id,
+            "status": job.status.value
+        }), 202
+            
     except Exception as e:
-        print(f"Error getting video title: {str(e)}")
-        return f"Video {video_id}"
+        print(f"Error queueing transcript indexing: {str(e)}")
+        return jsonify({"success": False, "message": f"❌ Error: {str(e)}"}), 500
 
-def mark_match_indexed(video_id, indexed=True):
+@search_bp.route('/backfill', methods=['POST'])
+def backfill_index():
+    """Queue indexing of every completed match that is not indexed yet"""
     try:
-        match = Match.query.filter_by(video_id=video_id).first()
-        
-        if not match:
-            print(f"⚠️ No match found for video_id: {video_id}")
-            return False
-        
-        match.azure_search_indexed = indexed
-        match.updated_at = datetime.utcnow()
+        data = request.get_json(silent=True) or {}
+        job = enqueue_job('backfill_index', payload={'limit': data.get('limit')})
         
-        db.session.commit()
-        print(f"✅ Updated match {video_id} indexing status to {indexed}")
-        return True
+        return jsonify({
+            "success": True,
+            "message": "✅ Queued search index backfill",
+            "job_id": job.id,
+            "status": job.status.value
+        }), 202
         
     except Exception as e:
-        print(f"❌ Error updating match indexing status: {str(e)}")
-        db.session.rollback()
-        return False
-
-@search_bp.route('/index/<video_id>', methods=['POST'])
-def index_transcript(video_id):
-    try:
-        captions_dir = Config.CAPTIONS_DIR
-        clean_file_path = os.path.join(captions_dir, f"{video_id}_clean.txt")
-                
-        if not os.path.exists(clean_file_path):
-            return jsonify({
-                "success": False, 
-                "message": f"❌ Clean transcript not found for video ID: {video_id}"
-            }), 404
-                
-        video_title = get_video_title(video_id)
-                
-        with open(clean_file_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-                
-        search_service = SearchService()
-        result = search_service.index_transcript(video_id, video_title, content)
-                
-        if result.get("success", False):
-            mark_match_indexed(video_id, True)
-            
-            return jsonify({
-                "success": True,
-                "message": f"✅ Indexed transcript for: {video_title}",
-                "video_id": video_id,
-                "title": video_title
-            })
-        else:
-            mark_match_indexed(video_id, False)
-            
-            return jsonify({
-                "success": False,
-                "message": f"❌ Failed to index transcript: {result.get('error', 'Unknown error')}"
-            }), 500
-            
-    except Exception as e:
-        print(f"Error indexing transcript: {str(e)}")
-        mark_match_indexed(video_id, False)
-        
+        print(f"Error queueing index backfill: {str(e)}")
         return jsonify({"success": False, "message": f"❌ Error: {str(e)}"}), 500
 
 @search_bp.route('/query', methods=['POST'])
@@ -87,13 +47,28 @@ def search_transcripts():
     data = request.get_json()
     query = data.get('query')
     top = data.get('top', 3)
+    mode = data.get('mode', 'keyword')
         
     if not query:
         return jsonify({"success": False, "message": "❌ No query provided"}), 400
         
     try:
-        search_service = SearchService()
-        results = search_service.search_transcript(query, top)
+        if mode == 'hybrid':
+            hybrid = hybrid_search(query, top)
+            results = hybrid['results']
+            
+            return jsonify({
+                "success": True,
+                "message": f"✅ Found {len(results)} results",
+                "results": results,
+                "timings": hybrid['timings'],
+                "failed_stages": hybrid['failed_stages']
+            })
+        elif mode == 'semantic':
+            results = semantic_search(query, top)
+        else:
+            search_service = get_search_service()
+            results = search_service.search_transcript(query, top)
                 
         if isinstance(results, dict) and not results.get("success", True):
             return jsonify({
@@ -1,31 +1,119 @@
+import gzip
+import hashlib
 import os
-from azure.storage.blob import BlobServiceClient, BlobClient, ContainerClient
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from azure.core import MatchConditions
+from azure.core.pipeline.transport import RequestsTransport
+from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError, ResourceNotModifiedError
+from azure.storage.blob import BlobServiceClient, BlobClient, ContainerClient, ContentSettings
 from azure_tennis_api.config import Config
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Blob batch requests accept at most 256 sub-requests
+DELETE_BATCH_SIZE = 256
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+def get_compression():
+    """Configured codec, falling back to gzip when zstandard isn't installed"""
+    compression = Config.BLOB_COMPRESSION
+    if compression == "zstd" and zstandard is None:
+        return "gzip"
+    return compression if compression in ("zstd", "gzip") else None
+
+def compress_transcript(content):
+    """UTF-8 encode and compress; returns (payload, content encoding or None, metadata)"""
+    data = content.encode("utf-8")
+    metadata = {
+        "original_size": str(len(data)),
+        "content_sha256": hashlib.sha256(data).hexdigest()
+    }
+    
+    compression = get_compression()
+    if compression == "zstd":
+        return zstandard.ZstdCompressor(level=Config.BLOB_COMPRESSION_LEVEL).compress(data), "zstd", metadata
+    if compression == "gzip":
+        return gzip.compress(data, compresslevel=min(Config.BLOB_COMPRESSION_LEVEL, 9)), "gzip", metadata
+    return data, None, metadata
+
+def decompress_transcript(payload):
+    """Decode a downloaded blob by its magic bytes.
+
+    Older blobs are plain UTF-8, and the HTTP stack may already have undone
+    a gzip Content-Encoding, so the header alone can't be trusted. Neither
+    magic number can begin valid UTF-8 text.
+    """
+    if payload.startswith(ZSTD_MAGIC):
+        if zstandard is None:
+            raise RuntimeError("Blob is zstd-compressed but the zstandard package is not installed")
+        # Streaming reader, since frames written by compress() may omit the content size
+        with zstandard.ZstdDecompressor().stream_reader(payload) as reader:
+            payload = reader.read()
+    elif payload.startswith(GZIP_MAGIC):
+        payload = gzip.decompress(payload)
+    return payload
+
+def get_blob_name(video_id, is_clean=False):
+    return f"{video_id}_clean.txt" if is_clean else f"{video_id}.txt"
+
 class BlobStorageService:
     def __init__(self):
         """Initialize Blob Storage Service"""
         self.connection_string = Config.AZURE_STORAGE_CONNECTION_STRING
         self.container_name = Config.AZURE_STORAGE_CONTAINER_NAME
         
-        # Blob service client
-        self.blob_service_client = BlobServiceClient.from_connection_string(self.connection_string)
+        # Blob service client, with a connection pool big enough for the bulk-operation threads
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=Config.BLOB_CONCURRENCY)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        self.blob_service_client = BlobServiceClient.from_connection_string(
+            self.connection_string,
+            transport=RequestsTransport(session=session, session_owner=False)
+        )
+        self.executor = ThreadPoolExecutor(max_workers=Config.BLOB_CONCURRENCY, thread_name_prefix="blob")
         
-        self._ensure_container_exists()
+        # Checked on the first upload rather than at import, so startup makes no request
+        self.container_ready = False
+        self.container_lock = threading.Lock()
     
     def _ensure_container_exists(self):
         """Create container if it doesn't exist"""
-        try:
-            container_client = self.blob_service_client.get_container_client(self.container_name)
-            container_client.get_container_properties()
-        except Exception:
-            # Container doesn't exist, create it
-            self.blob_service_client.create_container(self.container_name)
+        if self.container_ready:
+            return
+        
+        with self.container_lock:
+            if self.container_ready:
+                return
+            try:
+                self.blob_service_client.create_container(self.container_name)
+            except ResourceExistsError:
+                pass
+            except Exception as e:
+                # e.g. a SAS without container rights; the upload itself reports what's wrong
+                print(f"Warning: Could not create container {self.container_name}: {str(e)}")
+            self.container_ready = True
+    
+    def map_videos(self, function, video_ids, is_clean):
+        """{video_id: function(video_id)} run on the shared pool, at most BLOB_CONCURRENCY at a time"""
+        video_ids = list(dict.fromkeys(video_ids))
+        futures = {video_id: self.executor.submit(function, video_id, is_clean) for video_id in video_ids}
+        return {video_id: future.result() for video_id, future in futures.items()}
     
     def upload_transcript(self, video_id, content, is_clean=False):
         """Upload a transcript file to blob storage"""
         try:
-            blob_name = f"{video_id}_clean.txt" if is_clean else f"{video_id}.txt"
+            self._ensure_container_exists()
+            
+            blob_name = get_blob_name(video_id, is_clean)
             
             # blob client
             blob_client = self.blob_service_client.get_blob_client(
@@ -33,13 +121,27 @@ class BlobStorageService:
                 blob=blob_name
             )
             
+            payload, content_encoding, metadata = compress_transcript(content)
+            
             # Upload content
-            blob_client.upload_blob(content, overwrite=True)
+            upload_result = blob_client.upload_blob(
+                payload,
+                overwrite=True,
+                metadata=metadata,
+                content_settings=ContentSettings(
+                    content_type="text/plain; charset=utf-8",
+                    content_encoding=content_encoding
+                )
+            )
             
             return {
                 "success": True,
                 "message": f"Uploaded {blob_name} to blob storage",
-                "url": blob_client.url
+                "url": blob_client.url,
+                "original_size": int(metadata["original_size"]),
+                "stored_size": len(payload),
+                "content_encoding": content_encoding,
+                "etag": upload_result.get("etag")
             }
         except Exception as e:
             return {
@@ -47,11 +149,15 @@ class BlobStorageService:
                 "message": f"Failed to upload to blob storage: {str(e)}"
             }
     
-    def download_transcript(self, video_id, is_clean=False):
-        """Download a transcript file from blob storage"""
+    def download_transcript(self, video_id, is_clean=False, etag=None):
+        """Download a transcript file from blob storage.
+
+        With an etag, the request is conditional (If-None-Match) and returns
+        not_modified instead of the body when the blob hasn't changed.
+        """
         try:
             #blob name
-            blob_name = f"{video_id}_clean.txt" if is_clean else f"{video_id}.txt"
+            blob_name = get_blob_name(video_id, is_clean)
             
             #blob client
             blob_client = self.blob_service_client.get_blob_client(
@@ -60,12 +166,36 @@ class BlobStorageService:
             )
             
             # Download content
-            downloaded_blob = blob_client.download_blob()
-            content = downloaded_blob.content_as_text()
+            if etag:
+                try:
+                    downloaded_blob = blob_client.download_blob(etag=etag, match_condition=MatchConditions.IfModified)
+                except ResourceNotModifiedError:
+                    return {
+                        "success": True,
+                        "not_modified": True,
+                        "etag": etag
+                    }
+            else:
+                downloaded_blob = blob_client.download_blob()
+            payload = downloaded_blob.readall()
+            data = decompress_transcript(payload)
+            
+            expected_hash = (downloaded_blob.properties.metadata or {}).get("content_sha256")
+            if expected_hash and hashlib.sha256(data).hexdigest() != expected_hash:
+                raise ValueError(f"Content hash mismatch for {blob_name}")
             
             return {
                 "success": True,
-                "content": content
+                "content": data.decode("utf-8"),
+                "content_sha256": expected_hash,
+                "stored_size": len(payload),
+                "etag": downloaded_blob.properties.etag
+            }
+        except ResourceNotFoundError:
+            return {
+                "success": False,
+                "not_found": True,
+                "message": f"Blob {get_blob_name(video_id, is_clean)} not found"
             }
         except Exception as e:
             return {
@@ -73,23 +203,72 @@ class BlobStorageService:
                 "message": f"Failed to download from blob storage: {str(e)}"
             }
     
-    def list_transcripts(self):
-        """List all transcripts in the container"""
+    def get_transcript_properties(self, video_id, is_clean=False):
+        """Size and ETag of a transcript blob without downloading it"""
+        try:
+            blob_name = get_blob_name(video_id, is_clean)
+            
+            blob_client = self.blob_service_client.get_blob_client(
+                container=self.container_name,
+                blob=blob_name
+            )
+            
+            properties = blob_client.get_blob_properties()
+            
+            return {
+                "success": True,
+                "size": int((properties.metadata or {}).get("original_size", properties.size)),
+                "stored_size": properties.size,
+                "etag": properties.etag,
+                "last_modified": properties.last_modified
+            }
+        except ResourceNotFoundError:
+            return {
+                "success": False,
+                "not_found": True,
+                "message": f"Blob {get_blob_name(video_id, is_clean)} not found"
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "message": f"Failed to read blob properties: {str(e)}"
+            }
+    
+    def upload_many(self, transcripts, is_clean=False):
+        """Upload {video_id: content} concurrently; returns {video_id: upload result}"""
+        return self.map_videos(
+            lambda video_id, is_clean: self.upload_transcript(video_id, transcripts[video_id], is_clean=is_clean),
+            transcripts,
+            is_clean
+        )
+    
+    def download_many(self, video_ids, is_clean=False):
+        """Download several transcripts concurrently; returns {video_id: download result}"""
+        return self.map_videos(lambda video_id, is_clean: self.download_transcript(video_id, is_clean=is_clean), video_ids, is_clean)
+    
+    def list_transcripts(self, prefix=None, include_metadata=True):
+        """List the transcripts in the container, optionally only video ids starting with prefix.
+
+        Without metadata, sizes are the stored (compressed) ones but the
+        listing response is much smaller.
+        """
         try:
             container_client = self.blob_service_client.get_container_client(self.container_name)
-            blobs = container_client.list_blobs()
+            blobs = container_client.list_blobs(name_starts_with=prefix or None, include=["metadata"] if include_metadata else None)
             
             transcripts = []
             for blob in blobs:
                 blob_name = blob.name
                 is_clean = blob_name.endswith("_clean.txt")
-                video_id = blob_name.replace(".txt", "").replace("_clean", "")
+                video_id = blob_name[:-len("_clean.txt")] if is_clean else blob_name[:-len(".txt")]
                 
                 transcripts.append({
                     "video_id": video_id,
                     "blob_name": blob_name,
                     "is_clean": is_clean,
-                    "size": blob.size,
+                    # Uncompressed size where recorded, so listings match the text served
+                    "size": int((blob.metadata or {}).get("original_size", blob.size)),
+                    "stored_size": blob.size,
                     "last_modified": blob.last_modified
                 })
                 
@@ -107,7 +286,7 @@ class BlobStorageService:
         """Delete a transcript from blob storage"""
         try:
             # Determine blob name
-            blob_name = f"{video_id}_clean.txt" if is_clean else f"{video_id}.txt"
+            blob_name = get_blob_name(video_id, is_clean)
             
             # Create a blob client
             blob_client = self.blob_service_client.get_blob_client(
@@ -126,4 +305,43 @@ class BlobStorageService:
             return {
                 "success": False,
                 "message": f"Failed to delete from blob storage: {str(e)}"
-            }
\ No newline at end of file
+            }
+    
+    def _delete_batch(self, blob_names):
+        """Delete up to DELETE_BATCH_SIZE blobs in one batch request; returns the names that failed"""
+        container_client = self.blob_service_client.get_container_client(self.container_name)
+        try:
+            responses = container_client.delete_blobs(*blob_names, raise_on_any_failure=False)
+            # 404 means already gone, which is what we wanted
+            return [name for name, response in zip(blob_names, responses) if response.status_code not in (200, 202, 404)]
+        except Exception as e:
+            # Some endpoints (older emulators, certain SAS scopes) reject batch requests
+            print(f"Warning: Batch delete failed, deleting one by one: {str(e)}")
+            failed = []
+            for name in blob_names:
+                try:
+                    container_client.delete_blob(name)
+                except ResourceNotFoundError:
+                    pass
+                except Exception:
+                    failed.append(name)
+            return failed
+    
+    def delete_many(self, video_ids, kinds=(False, True)):
+        """Delete the raw and clean blobs of many videos with concurrent batch requests.
+
+        Missing blobs count as deleted. Returns the blob names that could not
+        be removed.
+        """
+        blob_names = [get_blob_name(video_id, is_clean) for video_id in dict.fromkeys(video_ids) for is_clean in kinds]
+        batches = [blob_names[start:start + DELETE_BATCH_SIZE] for start in range(0, len(blob_names), DELETE_BATCH_SIZE)]
+        
+        failed = []
+        for batch_failed in self.executor.map(self._delete_batch, batches):
+            failed.extend(batch_failed)
+        
+        return {
+            "success": not failed,
+            "deleted": len(blob_names) - len(failed),
+            "failed": failed
+        }
\ No newline at end of file
@@ -8,14 +8,14 @@ client = AzureOpenAI(
     api_version=Config.AZURE_OPENAI_VERSION
 )
 
-def chat_with_context(user_query, context, chat_history=None):
-    """Generating a response based on transcript context"""
+def build_messages(user_query, context, chat_history=None):
+    """System prompt with context, followed by the conversation so far"""
     if chat_history is None:
         chat_history = []
-        
-    try:
-        system_prompt = f"""
+    
+    system_prompt = f"""
         You are an AI assistant that helps answer questions about tennis matches based on video transcripts.
+        The context contains the transcript passages most relevant to the question, in match order.
         Use only the provided context to answer the user's question. If the answer is not in the
         context, politely say that you don't have that information.
         
@@ -25,17 +25,23 @@ def chat_with_context(user_query, context, chat_history=None):
         Context:
         {context}
         """
+    
+    messages = [{"role": "system", "content": system_prompt}]
+    
+    # chat history
+    for message in chat_history:
+        messages.append({
+            "role": message["role"],
+            "content": message["content"]
+        })
         
-        messages = [{"role": "system", "content": system_prompt}]
-        
-        # chat history
-        for message in chat_history:
-            messages.append({
-                "role": message["role"],
-                "content": message["content"]
-            })
-            
-        messages.append({"role": "user", "content": user_query})
+    messages.append({"role": "user", "content": user_query})
+    return messages
+
+def chat_with_context(user_query, context, chat_history=None):
+    """Generating a response based on transcript context"""
+    try:
+        messages = build_messages(user_query, context, chat_history)
         
         # Call Azure OpenAI API
         response = client.chat.completions.create(
@@ -49,4 +55,21 @@ def chat_with_context(user_query, context, chat_history=None):
     
     except Exception as e:
         print(f"Error in chat completion: {str(e)}")
-        return "I'm sorry, I encountered an error while processing your request."
\ No newline at end of file
+        return "I'm sorry, I encountered an error while processing your request."
+
+def chat_with_context_stream(user_query, context, chat_history=None):
+    """Yield the response text as Azure OpenAI streams it"""
+    messages = build_messages(user_query, context, chat_history)
+    
+    stream = client.chat.completions.create(
+        model=Config.AZURE_OPENAI_DEPLOYMENT,
+        messages=messages,
+        temperature=0.7,
+        max_tokens=1000,
+        stream=True
+    )
+    
+    for chunk in stream:
+        # Azure sends content-filter results in chunks without choices
+        if chunk.choices and chunk.choices[0].delta and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
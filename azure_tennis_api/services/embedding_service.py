@@ -0,0 +1,467 @@
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+from openai import RateLimitError
+from azure_tennis_api.config import Config
+from azure_tennis_api.services.openai_service import limited_client, rate_limiter, get_retry_after
+from azure_tennis_api.services.search_service import make_passage_keys
+from azure_tennis_api.services.transcript_chunker import count_tokens, split_passages
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+EMBEDDING_DIMENSIONS = 1536  # text-embedding-ada-002
+
+def content_hash(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+def embed_texts(texts):
+    """Embed texts with the configured deployment, EMBEDDING_BATCH_SIZE inputs per request.
+
+    Requests draw from the same rate limiter as cleaning, so a backfill of
+    embeddings and cleaning jobs together stay within the quota.
+    """
+    vectors = []
+    for start in range(0, len(texts), Config.EMBEDDING_BATCH_SIZE):
+        batch = texts[start:start + Config.EMBEDDING_BATCH_SIZE]
+        batch_tokens = sum(count_tokens(text) for text in batch)
+
+        for attempt in range(Config.AZURE_OPENAI_MAX_RETRIES + 1):
+            rate_limiter.acquire(batch_tokens)
+
+            try:
+                response = limited_client.embeddings.create(
+                    model=Config.AZURE_EMBEDDING_DEPLOYMENT,
+                    input=batch
+                )
+                break
+            except RateLimitError as e:
+                if attempt == Config.AZURE_OPENAI_MAX_RETRIES:
+                    raise
+                retry_after = get_retry_after(e)
+                print(f"Embedding request rate limited, retrying in {retry_after:.1f}s")
+                rate_limiter.pause(retry_after)
+
+        # The API may return items out of order; index tells us where each belongs
+        for item in sorted(response.data, key=lambda item: item.index):
+            vectors.append(item.embedding)
+
+    return np.asarray(vectors, dtype=np.float32).reshape(len(vectors), EMBEDDING_DIMENSIONS)
+
+def quantize(vectors):
+    """Symmetric int8 codes with one float32 scale per vector"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+def train_centroids(sample, nlist, iterations=10, seed=0):
+    """Spherical k-means; vectors are unit length so dot product is cosine"""
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = np.argmax(sample @ centroids.T, axis=1)
+        for list_id in range(nlist):
+            members = sample[assignments == list_id]
+            if len(members):
+                centroid = members.sum(axis=0)
+                centroids[list_id] = centroid / (np.linalg.norm(centroid) or 1.0)
+    return centroids
+
+def assign_lists(vectors, centroids, batch_size=8192):
+    assignments = np.empty(len(vectors), dtype=np.int32)
+    for start in range(0, len(vectors), batch_size):
+        batch = np.asarray(vectors[start:start + batch_size], dtype=np.float32)
+        assignments[start:start + batch_size] = np.argmax(batch @ centroids.T, axis=1)
+    return assignments
+
+class VectorStore:
+    """Append-only vector files plus a JSON map of rows to passages.
+
+    vectors.f32 holds one float32 row per distinct passage content hash,
+    with int8 codes and per-row scales alongside in codes.i8/scales.f32.
+    All three are opened with np.memmap. Queries scan only the int8 codes
+    and read full-precision rows just to re-rank the shortlist, so the
+    working set is about a quarter of the float vectors.
+
+    Once there are VECTOR_IVF_MIN_ROWS rows, an IVF index (k-means
+    centroids plus a list assignment per row, in ivf.npz) narrows each
+    query to the VECTOR_IVF_NPROBE closest lists. New rows are assigned
+    to their nearest centroid as they are embedded, and the centroids are
+    retrained when the store has doubled since the last training.
+
+    index.json records the hash of every row and, per video, which row
+    each passage uses. Re-embedding a transcript only calls the API for
+    passages whose content hash has no row yet; removing a video just
+    drops its passages, leaving unreferenced rows out of every query.
+    """
+
+    def __init__(self, store_dir=None):
+        self.store_dir = store_dir or Config.VECTOR_STORE_DIR
+        self.vectors_path = os.path.join(self.store_dir, "vectors.f32")
+        self.codes_path = os.path.join(self.store_dir, "codes.i8")
+        self.scales_path = os.path.join(self.store_dir, "scales.f32")
+        self.ivf_path = os.path.join(self.store_dir, "ivf.npz")
+        self.index_path = os.path.join(self.store_dir, "index.json")
+        self.lock = threading.RLock()
+        self.loaded_mtime = None
+        self.training = False
+        self.reset()
+        self.load()
+
+    def reset(self):
+        self.row_hashes = []
+        self.row_by_hash = {}
+        # video_id -> list of {row, passage_index, chunk_id, title}
+        self.video_passages = {}
+        self.vectors = None
+        self.codes = None
+        self.scales = None
+        self.row_passages = {}
+        self.live_rows = np.empty(0, dtype=np.int64)
+        self.centroids = None
+        self.assignments = np.empty(0, dtype=np.int32)
+        self.trained_rows = 0
+        self.list_rows = []
+
+    def lock_file(self):
+        os.makedirs(self.store_dir, exist_ok=True)
+        handle = open(os.path.join(self.store_dir, ".lock"), 'a')
+        if fcntl:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        return handle
+
+    def file_mtimes(self):
+        """Modification times of index.json and ivf.npz, to notice saves by other processes"""
+        mtimes = []
+        for path in (self.index_path, self.ivf_path):
+            try:
+                mtimes.append(os.path.getmtime(path))
+            except OSError:
+                mtimes.append(None)
+        return tuple(mtimes)
+
+    def load(self):
+        try:
+            mtime = self.file_mtimes()
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        self.reset()
+        self.row_hashes = state['row_hashes']
+        self.row_by_hash = {row_hash: row for row, row_hash in enumerate(self.row_hashes)}
+        self.video_passages = state['video_passages']
+        self.loaded_mtime = mtime
+
+        try:
+            with np.load(self.ivf_path) as ivf:
+                self.centroids = ivf['centroids']
+                self.assignments = ivf['assignments']
+                self.trained_rows = int(ivf['trained_rows'])
+        except (OSError, KeyError, ValueError):
+            pass
+
+        self._map_vectors()
+        return True
+
+    def _map_vectors(self):
+        rows = len(self.row_hashes)
+        if rows:
+            self.vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(rows, EMBEDDING_DIMENSIONS))
+            self.codes = np.memmap(self.codes_path, dtype=np.int8, mode='r', shape=(rows, EMBEDDING_DIMENSIONS))
+            self.scales = np.memmap(self.scales_path, dtype=np.float32, mode='r', shape=(rows,))
+        else:
+            self.vectors = self.codes = self.scales = None
+
+        self.row_passages = {}
+        for video_id, passages in self.video_passages.items():
+            for passage in passages:
+                self.row_passages.setdefault(passage['row'], []).append((video_id, passage))
+        self.live_rows = np.fromiter(sorted(self.row_passages), dtype=np.int64, count=len(self.row_passages))
+
+        # Inverted lists of live rows, for probing
+        self.list_rows = []
+        if self.centroids is not None and len(self.assignments) == rows:
+            live_assignments = self.assignments[self.live_rows]
+            order = np.argsort(live_assignments, kind='stable')
+            bounds = np.searchsorted(live_assignments[order], np.arange(len(self.centroids) + 1))
+            sorted_rows = self.live_rows[order]
+            self.list_rows = [sorted_rows[bounds[i]:bounds[i + 1]] for i in range(len(self.centroids))]
+
+    def _append_rows(self, vectors):
+        """Write full-precision rows and their int8 codes, making sure they reach disk before index.json names them.
+
+        Each file is first cut back to the rows index.json knows about, so
+        rows left behind by an append that never got saved can't shift the
+        numbering of the new ones.
+        """
+        codes, scales = quantize(vectors)
+        rows = len(self.row_hashes)
+        for path, data, row_bytes in (
+            (self.vectors_path, vectors, EMBEDDING_DIMENSIONS * 4),
+            (self.codes_path, codes, EMBEDDING_DIMENSIONS),
+            (self.scales_path, scales, 4)
+        ):
+            with open(path, 'ab') as f:
+                f.truncate(rows * row_bytes)
+                f.write(data.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _quantize_missing_rows(self):
+        """Stores written before quantization existed only have vectors.f32"""
+        rows = len(self.row_hashes)
+        try:
+            coded_rows = os.path.getsize(self.scales_path) // 4
+        except OSError:
+            coded_rows = 0
+        if coded_rows >= rows:
+            return
+
+        # Trim any half-written tail and rebuild codes from the float rows
+        vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(rows, EMBEDDING_DIMENSIONS))
+        for path in (self.codes_path, self.scales_path):
+            if os.path.exists(path):
+                os.remove(path)
+        for start in range(0, rows, 8192):
+            codes, scales = quantize(vectors[start:start + 8192])
+            with open(self.codes_path, 'ab') as f:
+                f.write(codes.tobytes())
+            with open(self.scales_path, 'ab') as f:
+                f.write(scales.tobytes())
+
+    def _write_ivf(self):
+        with open(self.ivf_path + '.tmp', 'wb') as f:
+            np.savez(f, centroids=self.centroids, assignments=self.assignments, trained_rows=self.trained_rows)
+        os.replace(self.ivf_path + '.tmp', self.ivf_path)
+
+    def _update_ivf(self, previous_rows):
+        """Assign new rows to the current lists; True when the lists are due for retraining.
+
+        Retraining is left to retrain_ivf, which runs outside the lock. Until
+        it finishes, rows the lists don't cover make queries fall back to a
+        scan of every live row.
+        """
+        rows = len(self.row_hashes)
+        if rows < Config.VECTOR_IVF_MIN_ROWS:
+            return False
+
+        current = self.centroids is not None and len(self.assignments) == previous_rows
+        if not current or rows >= 2 * self.trained_rows:
+            return True
+        if rows == previous_rows:
+            return False
+
+        vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(rows, EMBEDDING_DIMENSIONS))
+        self.assignments = np.concatenate([
+            self.assignments[:previous_rows],
+            assign_lists(vectors[previous_rows:], self.centroids)
+        ])
+        self._write_ivf()
+        return False
+
+    def retrain_ivf(self):
+        """Train lists on a snapshot of the rows without holding the lock, then swap them in.
+
+        Rows are only ever appended, so the first rows of the snapshot can't
+        change underneath the training; rows added meanwhile are assigned to
+        the new lists during the swap.
+        """
+        with self.lock:
+            if self.training:
+                return False
+            self.training = True
+            rows = len(self.row_hashes)
+
+        try:
+            vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(rows, EMBEDDING_DIMENSIONS))
+            nlist = max(1, int(np.sqrt(rows)))
+            rng = np.random.default_rng(rows)
+            sample_size = min(rows, nlist * 64)
+            sample = np.asarray(vectors[np.sort(rng.choice(rows, sample_size, replace=False))])
+            print(f"Training vector index: {nlist} lists from {sample_size} of {rows} rows")
+            centroids = train_centroids(sample, nlist)
+            assignments = assign_lists(vectors, centroids)
+
+            with self.lock:
+                handle = self.lock_file()
+                try:
+                    self.reload_if_changed()
+                    if self.centroids is not None and self.trained_rows >= rows:
+                        # Another process retrained on at least as many rows meanwhile
+                        return False
+                    total = len(self.row_hashes)
+                    if total > rows:
+                        vectors = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(total, EMBEDDING_DIMENSIONS))
+                        assignments = np.concatenate([assignments, assign_lists(vectors[rows:], centroids)])
+                    self.centroids = centroids
+                    self.assignments = assignments
+                    self.trained_rows = rows
+                    self._write_ivf()
+                    self.loaded_mtime = self.file_mtimes()
+                    self._map_vectors()
+                finally:
+                    handle.close()
+            return True
+        finally:
+            with self.lock:
+                self.training = False
+
+    def save(self):
+        temp_path = self.index_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({
+                'dimensions': EMBEDDING_DIMENSIONS,
+                'row_hashes': self.row_hashes,
+                'video_passages': self.video_passages
+            }, f)
+        os.replace(temp_path, self.index_path)
+        self.loaded_mtime = self.file_mtimes()
+        self._map_vectors()
+
+    def reload_if_changed(self):
+        mtime = self.file_mtimes()
+        if mtime[0] is None:
+            return
+        if mtime != self.loaded_mtime:
+            self.load()
+
+    def embed_transcript(self, video_id, title, transcript):
+        """Embed the passages of a transcript, reusing vectors for unchanged content"""
+        passages = split_passages(transcript, Config.SEARCH_PASSAGE_TOKENS, Config.SEARCH_PASSAGE_OVERLAP_TOKENS)
+
+        with self.lock:
+            handle = self.lock_file()
+            try:
+                self.reload_if_changed()
+                self._quantize_missing_rows()
+                previous_rows = len(self.row_hashes)
+
+                hashes = [content_hash(passage['content']) for passage in passages]
+                missing = {}
+                for passage, passage_hash in zip(passages, hashes):
+                    if passage_hash not in self.row_by_hash and passage_hash not in missing:
+                        missing[passage_hash] = passage['content']
+
+                if missing:
+                    self._append_rows(embed_texts(list(missing.values())))
+                    for passage_hash in missing:
+                        self.row_by_hash[passage_hash] = len(self.row_hashes)
+                        self.row_hashes.append(passage_hash)
+
+                self.video_passages[video_id] = [
+                    {
+                        'row': self.row_by_hash[passage_hash],
+                        'passage_index': passage['index'],
+                        'chunk_id': key,
+                        'title': title
+                    }
+                    for passage, passage_hash, key in zip(passages, hashes, make_passage_keys(video_id, passages))
+                ]
+                retrain = self._update_ivf(previous_rows)
+                self.save()
+            except Exception:
+                # Drop the unsaved rows from memory; the files are trimmed on the next append
+                if not self.load():
+                    self.reset()
+                raise
+            finally:
+                handle.close()
+
+        # Queries and other embeds carry on against the old lists while this trains
+        if retrain:
+            self.retrain_ivf()
+
+        print(f"✅ Embedded {video_id}: {len(passages)} passages, {len(missing)} new vectors")
+        return {
+            "success": True,
+            "video_id": video_id,
+            "passages": len(passages),
+            "embedded": len(missing)
+        }
+
+    def remove_video(self, video_id):
+        """Forget a video's passages; its vectors stay for reuse by identical content"""
+        self.remove_videos([video_id])
+
+    def remove_videos(self, video_ids):
+        with self.lock:
+            handle = self.lock_file()
+            try:
+                self.reload_if_changed()
+                removed = [video_id for video_id in video_ids if self.video_passages.pop(video_id, None) is not None]
+                if removed:
+                    self.save()
+            finally:
+                handle.close()
+
+    def candidate_rows(self, query_vector):
+        """Live rows in the lists closest to the query, or every live row before the index is trained"""
+        if not self.list_rows:
+            return self.live_rows
+
+        nprobe = min(Config.VECTOR_IVF_NPROBE, len(self.centroids))
+        closest = np.argpartition(-(self.centroids @ query_vector), nprobe - 1)[:nprobe]
+        return np.concatenate([self.list_rows[list_id] for list_id in closest])
+
+    def search(self, query_vector, top=3):
+        """Top passages by cosine similarity (ada-002 vectors are unit length).
+
+        Candidates are scored on their int8 codes, then the best
+        top * VECTOR_RERANK_FACTOR rows are re-scored exactly.
+        """
+        with self.lock:
+            self.reload_if_changed()
+            if self.vectors is None or not len(self.live_rows):
+                return []
+
+            query_vector = np.asarray(query_vector, dtype=np.float32)
+            rows = self.candidate_rows(query_vector)
+            if not len(rows):
+                return []
+
+            approximate = (self.codes[rows].astype(np.float32) @ query_vector) * self.scales[rows]
+            shortlist_size = min(len(rows), max(top * Config.VECTOR_RERANK_FACTOR, top))
+            shortlist = rows[np.argpartition(-approximate, shortlist_size - 1)[:shortlist_size]]
+            shortlist.sort()  # sequential reads from the memmap
+            exact = self.vectors[shortlist] @ query_vector
+
+            results = []
+            for position in np.argsort(-exact):
+                for video_id, passage in self.row_passages.get(int(shortlist[position]), []):
+                    results.append({
+                        "id": passage['chunk_id'],
+                        "video_id": video_id,
+                        "passage_index": passage['passage_index'],
+                        "title": passage['title'],
+                        "url": f"https://www.youtube.com/watch?v={video_id}",
+                        "score": float(exact[position])
+                    })
+                if len(results) >= top:
+                    break
+            return results[:top]
+
+_vector_store = None
+_vector_store_lock = threading.Lock()
+
+def get_vector_store():
+    global _vector_store
+
+    if _vector_store is None:
+        with _vector_store_lock:
+            if _vector_store is None:
+                _vector_store = VectorStore()
+
+    return _vector_store
+
+def semantic_search(query, top=3):
+    """Embed the query once and score it against every stored passage"""
+    query_vector = embed_texts([query])[0]
+    return get_vector_store().search(query_vector, top)
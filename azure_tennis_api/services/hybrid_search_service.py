@@ -0,0 +1,92 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from azure_tennis_api.config import Config
+from azure_tennis_api.services.search_service import get_search_service
+from azure_tennis_api.services.embedding_service import embed_texts, get_vector_store
+
+# Shared so each query doesn't pay for starting threads; one vector stage per in-flight query
+executor = ThreadPoolExecutor(max_workers=Config.HYBRID_SEARCH_WORKERS, thread_name_prefix="hybrid-search")
+
+def elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 2)
+
+def reciprocal_rank_fusion(ranked_lists, k=None):
+    """Fuse ranked result lists by summing 1 / (k + rank) per result id"""
+    k = k if k is not None else Config.HYBRID_RRF_K
+    fused = {}
+    for results in ranked_lists:
+        for rank, result in enumerate(results, start=1):
+            entry = fused.setdefault(result["id"], {**result, "rrf_score": 0.0})
+            entry["rrf_score"] += 1.0 / (k + rank)
+            # Keep highlights from whichever stage produced them
+            for key, value in result.items():
+                entry.setdefault(key, value)
+    return sorted(fused.values(), key=lambda result: result["rrf_score"], reverse=True)
+
+def keyword_stage(query, candidates):
+    started = time.perf_counter()
+    results = get_search_service().search_transcript(query, candidates)
+    if isinstance(results, dict):
+        raise RuntimeError(results.get("error", "Keyword search failed"))
+    return results, {"keyword_ms": elapsed_ms(started)}
+
+def vector_stage(query, candidates):
+    started = time.perf_counter()
+    query_vector = embed_texts([query])[0]
+    embedded = time.perf_counter()
+    results = get_vector_store().search(query_vector, candidates)
+    return results, {
+        "embed_ms": elapsed_ms(started),
+        "vector_ms": elapsed_ms(embedded)
+    }
+
+def hybrid_search(query, top=3):
+    """Keyword and vector retrieval run concurrently, fused with RRF, one result per video.
+
+    Only the vector stage goes to the shared pool; the keyword stage runs on
+    the request's own thread meanwhile, so a query holds at most one pool
+    thread and doesn't queue behind other queries' keyword stages.
+    """
+    started = time.perf_counter()
+    candidates = max(top, Config.HYBRID_CANDIDATES)
+
+    vector_future = executor.submit(vector_stage, query, candidates)
+
+    def keyword_result():
+        return keyword_stage(query, candidates)
+
+    ranked_lists = []
+    timings = {}
+    failed_stages = []
+    for stage, run in (("keyword", keyword_result), ("vector", vector_future.result)):
+        try:
+            results, stage_timings = run()
+        except Exception as e:
+            # One backend being down shouldn't take the other's results with it
+            print(f"⚠️ Hybrid search {stage} stage failed: {str(e)}")
+            failed_stages.append(stage)
+            continue
+        ranked_lists.append(results)
+        timings.update(stage_timings)
+
+    if not ranked_lists:
+        raise RuntimeError("Both keyword and vector search failed")
+
+    fusion_started = time.perf_counter()
+    results = []
+    seen_videos = set()
+    for result in reciprocal_rank_fusion(ranked_lists):
+        if result["video_id"] in seen_videos:
+            continue
+        seen_videos.add(result["video_id"])
+        results.append(result)
+        if len(results) >= top:
+            break
+    timings["fusion_ms"] = elapsed_ms(fusion_started)
+    timings["total_ms"] = elapsed_ms(started)
+
+    return {
+        "results": results,
+        "timings": timings,
+        "failed_stages": failed_stages
+    }
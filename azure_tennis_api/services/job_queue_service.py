@@ -0,0 +1,270 @@
+import os
+import socket
+from datetime import datetime, timedelta
+from azure_tennis_api.config import Config
+from azure_tennis_api.models import db, Job, JobStatus
+
+ACTIVE_STATUSES = (JobStatus.QUEUED, JobStatus.RUNNING)
+FINISHED_STATUSES = (JobStatus.COMPLETED, JobStatus.FAILED, JobStatus.CANCELLED)
+
+class JobCancelled(Exception):
+    """Raised inside a running job when a cancel was requested"""
+    pass
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def enqueue_job(job_type, video_id=None, payload=None):
+    """Queue a job, reusing an identical job that is still waiting to run"""
+    existing_job = Job.query.filter(
+        Job.job_type == job_type,
+        Job.video_id == video_id,
+        Job.status == JobStatus.QUEUED,
+        Job.cancel_requested == False
+    ).order_by(Job.id).first()
+
+    if existing_job:
+        return existing_job
+
+    job = Job(
+        job_type=job_type,
+        video_id=video_id,
+        payload=payload or {},
+        status=JobStatus.QUEUED,
+        max_attempts=Config.JOB_MAX_ATTEMPTS,
+        run_after=datetime.utcnow()
+    )
+
+    db.session.add(job)
+    db.session.commit()
+
+    print(f"📥 Queued {job_type} job {job.id} for {video_id}")
+    return job
+
+def enqueue_jobs(job_type, payloads_by_video):
+    """Queue one job per video in a single transaction, reusing any still waiting to run"""
+    video_ids = list(payloads_by_video)
+    existing = {
+        job.video_id: job
+        for job in Job.query.filter(
+            Job.job_type == job_type,
+            Job.video_id.in_(video_ids),
+            Job.status == JobStatus.QUEUED,
+            Job.cancel_requested == False
+        ).order_by(Job.id.desc())
+    }
+
+    jobs = {}
+    now = datetime.utcnow()
+    for video_id in video_ids:
+        if video_id in existing:
+            jobs[video_id] = existing[video_id]
+            continue
+        jobs[video_id] = Job(
+            job_type=job_type,
+            video_id=video_id,
+            payload=payloads_by_video[video_id] or {},
+            status=JobStatus.QUEUED,
+            max_attempts=Config.JOB_MAX_ATTEMPTS,
+            run_after=now
+        )
+        db.session.add(jobs[video_id])
+
+    db.session.commit()
+
+    print(f"📥 Queued {len(jobs) - len(existing)} {job_type} jobs ({len(existing)} already queued)")
+    return jobs
+
+def get_job(job_id):
+    return Job.query.get(job_id)
+
+def claim_next_job(worker_id, job_types=None):
+    """Lock and mark the oldest runnable job as running.
+
+    FOR UPDATE SKIP LOCKED lets any number of workers poll the same table
+    without blocking each other or claiming the same row twice.
+    """
+    try:
+        query = Job.query.filter(
+            Job.status == JobStatus.QUEUED,
+            Job.run_after <= datetime.utcnow()
+        )
+
+        if job_types:
+            query = query.filter(Job.job_type.in_(job_types))
+
+        job = query.order_by(Job.id).with_for_update(skip_locked=True).first()
+
+        if not job:
+            db.session.commit()
+            return None
+
+        now = datetime.utcnow()
+        job.status = JobStatus.RUNNING
+        job.attempts += 1
+        job.locked_by = worker_id
+        job.locked_at = now
+        job.started_at = now
+        job.updated_at = now
+
+        db.session.commit()
+        return job
+
+    except Exception as e:
+        print(f"❌ Error claiming job: {str(e)}")
+        db.session.rollback()
+        return None
+
+def get_owned_job(job_id, worker_id):
+    """Lock a job row, returning it only while this worker still holds its lease.
+
+    After requeue_stale_jobs hands a slow job to another worker, the
+    original worker gets None here, so it can't heartbeat, complete or
+    fail a job it no longer owns.
+    """
+    job = Job.query.filter_by(id=job_id).with_for_update().populate_existing().first()
+
+    if not job or job.status != JobStatus.RUNNING or job.locked_by != worker_id:
+        db.session.commit()
+        return None
+
+    return job
+
+def heartbeat_job(job_id, worker_id):
+    """Extend the lease of a running job and raise if it was cancelled or taken over"""
+    job = get_owned_job(job_id, worker_id)
+
+    if not job:
+        raise JobCancelled(f"Job {job_id} is no longer held by {worker_id}")
+
+    if job.cancel_requested:
+        db.session.commit()
+        raise JobCancelled(f"Job {job_id} was cancelled")
+
+    job.locked_at = datetime.utcnow()
+    db.session.commit()
+
+def complete_job(job_id, worker_id, result=None):
+    job = get_owned_job(job_id, worker_id)
+
+    if not job:
+        print(f"⚠️ Job {job_id} is no longer held by {worker_id}, not completing it")
+        return None
+
+    now = datetime.utcnow()
+    job.status = JobStatus.COMPLETED
+    job.result = result
+    job.error_message = None
+    job.locked_by = None
+    job.locked_at = None
+    job.finished_at = now
+    job.updated_at = now
+
+    db.session.commit()
+    print(f"✅ Job {job_id} ({job.job_type}) completed")
+    return job
+
+def fail_job(job_id, worker_id, error_message, result=None):
+    """Mark a job failed, putting it back in the queue while attempts remain"""
+    job = get_owned_job(job_id, worker_id)
+
+    if not job:
+        print(f"⚠️ Job {job_id} is no longer held by {worker_id}, not failing it")
+        return None
+
+    now = datetime.utcnow()
+    job.error_message = error_message
+    job.result = result
+    job.locked_by = None
+    job.locked_at = None
+    job.updated_at = now
+
+    if job.attempts < job.max_attempts and not job.cancel_requested:
+        job.status = JobStatus.QUEUED
+        job.run_after = now + timedelta(seconds=Config.JOB_RETRY_DELAY_SECONDS * job.attempts)
+        print(f"🔁 Job {job_id} failed (attempt {job.attempts}/{job.max_attempts}), retrying later: {error_message}")
+    else:
+        job.status = JobStatus.FAILED
+        job.finished_at = now
+        print(f"❌ Job {job_id} failed: {error_message}")
+
+    db.session.commit()
+    return job
+
+def mark_job_cancelled(job_id, worker_id):
+    job = get_owned_job(job_id, worker_id)
+
+    if not job:
+        return None
+
+    now = datetime.utcnow()
+    job.status = JobStatus.CANCELLED
+    job.locked_by = None
+    job.locked_at = None
+    job.finished_at = now
+    job.updated_at = now
+
+    db.session.commit()
+    print(f"🛑 Job {job_id} cancelled")
+    return job
+
+def cancel_job(job_id):
+    """Cancel a queued job immediately or ask a running job to stop"""
+    job = Job.query.filter_by(id=job_id).with_for_update().first()
+
+    if not job:
+        db.session.commit()
+        return None
+
+    if job.status in FINISHED_STATUSES:
+        db.session.commit()
+        return job
+
+    job.cancel_requested = True
+    job.updated_at = datetime.utcnow()
+
+    if job.status == JobStatus.QUEUED:
+        job.status = JobStatus.CANCELLED
+        job.finished_at = job.updated_at
+
+    db.session.commit()
+    return job
+
+def requeue_stale_jobs(lease_seconds=None):
+    """Return jobs whose worker stopped heartbeating to the queue"""
+    if lease_seconds is None:
+        lease_seconds = Config.JOB_LEASE_SECONDS
+
+    try:
+        cutoff = datetime.utcnow() - timedelta(seconds=lease_seconds)
+        stale_jobs = Job.query.filter(
+            Job.status == JobStatus.RUNNING,
+            Job.locked_at < cutoff
+        ).with_for_update(skip_locked=True).all()
+
+        for job in stale_jobs:
+            job.locked_by = None
+            job.locked_at = None
+            job.updated_at = datetime.utcnow()
+
+            if job.cancel_requested:
+                job.status = JobStatus.CANCELLED
+                job.finished_at = job.updated_at
+            elif job.attempts < job.max_attempts:
+                job.status = JobStatus.QUEUED
+                job.run_after = job.updated_at
+            else:
+                job.status = JobStatus.FAILED
+                job.error_message = "Worker lease expired"
+                job.finished_at = job.updated_at
+
+        db.session.commit()
+
+        if stale_jobs:
+            print(f"⚠️ Recovered {len(stale_jobs)} stale jobs")
+        return len(stale_jobs)
+
+    except Exception as e:
+        print(f"❌ Error recovering stale jobs: {str(e)}")
+        db.session.rollback()
+        return 0
@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from azure_tennis_api.config import Config
+
+class LLMCache:
+    """Content-addressed on-disk cache of LLM completions.
+
+    Entries are keyed by a hash of everything that determines the output,
+    so an unchanged chunk is never sent to the model twice. The store is a
+    single SQLite file and is evicted least-recently-used first once it
+    grows past max_bytes.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=None):
+        self.cache_dir = cache_dir or Config.LLM_CACHE_DIR
+        self.max_bytes = max_bytes if max_bytes is not None else Config.LLM_CACHE_MAX_BYTES
+        self.lock = threading.Lock()
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.connection = sqlite3.connect(
+            os.path.join(self.cache_dir, "llm_cache.sqlite3"),
+            timeout=30,
+            check_same_thread=False
+        )
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS completions (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self.connection.execute("CREATE INDEX IF NOT EXISTS ix_completions_last_access ON completions (last_access)")
+        # Running total of entry sizes, kept in the file so every process sharing it sees the same figure
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS cache_totals (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+        """)
+        self.connection.execute("""
+            INSERT OR IGNORE INTO cache_totals (name, value)
+            SELECT 'size', COALESCE(SUM(size), 0) FROM completions
+        """)
+        self.connection.commit()
+
+    @staticmethod
+    def make_key(text, system_prompt, deployment, temperature):
+        payload = json.dumps([text, system_prompt, deployment, temperature], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        try:
+            with self.lock:
+                row = self.connection.execute("SELECT value FROM completions WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                self.connection.execute("UPDATE completions SET last_access = ? WHERE key = ?", (time.time(), key))
+                self.connection.commit()
+                return row[0]
+        except sqlite3.Error as e:
+            print(f"Warning: LLM cache read failed: {str(e)}")
+            return None
+
+    def put(self, key, value):
+        try:
+            size = len(value.encode('utf-8'))
+            with self.lock:
+                # Write lock up front so the size read and the total update can't interleave with another process
+                self.connection.execute("BEGIN IMMEDIATE")
+                try:
+                    row = self.connection.execute("SELECT size FROM completions WHERE key = ?", (key,)).fetchone()
+                    self.connection.execute(
+                        "INSERT OR REPLACE INTO completions (key, value, size, last_access) VALUES (?, ?, ?, ?)",
+                        (key, value, size, time.time())
+                    )
+                    self._add_to_total(size - (row[0] if row else 0))
+                    self._evict()
+                    self.connection.commit()
+                except sqlite3.Error:
+                    self.connection.rollback()
+                    raise
+        except sqlite3.Error as e:
+            print(f"Warning: LLM cache write failed: {str(e)}")
+
+    def _add_to_total(self, delta):
+        self.connection.execute("UPDATE cache_totals SET value = value + ? WHERE name = 'size'", (delta,))
+
+    def _evict(self):
+        total_size = self.connection.execute("SELECT value FROM cache_totals WHERE name = 'size'").fetchone()[0]
+        if total_size <= self.max_bytes:
+            return
+
+        # Trim to 90% so eviction does not run again on the very next write
+        to_free = total_size - int(self.max_bytes * 0.9)
+        freed = 0
+        evicted_keys = []
+
+        for key, size in self.connection.execute("SELECT key, size FROM completions ORDER BY last_access"):
+            evicted_keys.append((key,))
+            freed += size
+            if freed >= to_free:
+                break
+
+        self.connection.executemany("DELETE FROM completions WHERE key = ?", evicted_keys)
+        self._add_to_total(-freed)
+        print(f"LLM cache evicted {len(evicted_keys)} entries ({freed} bytes)")
@@ -0,0 +1,482 @@
+import math
+import os
+import pickle
+import re
+import threading
+from collections import Counter, defaultdict
+from azure_tennis_api.config import Config
+from azure_tennis_api.services.retrieval_service import tokenize, TOKEN_PATTERN, STOP_WORDS
+from azure_tennis_api.services.search_service import make_passage_keys
+from azure_tennis_api.services.transcript_chunker import split_passages
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+INDEX_FORMAT_VERSION = 1
+PHRASE_PATTERN = re.compile(r'"([^"]+)"')
+
+def encode_varint(value, out):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def decode_varint(data, offset):
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+def iter_postings(data):
+    """Yield (doc_id, positions) from a delta- and varint-encoded posting list"""
+    offset = 0
+    doc_id = 0
+    end = len(data)
+    while offset < end:
+        gap, offset = decode_varint(data, offset)
+        doc_id += gap
+        frequency, offset = decode_varint(data, offset)
+        positions = []
+        position = 0
+        for _ in range(frequency):
+            position_gap, offset = decode_varint(data, offset)
+            position += position_gap
+            positions.append(position)
+        yield doc_id, positions
+
+class LocalSearchService:
+    """In-process BM25 search over clean transcript passages.
+
+    Mirrors the SearchService index/search contract so it can stand in for
+    Azure AI Search offline and in tests. Postings are kept per term as
+    append-only varint byte strings of (doc gap, frequency, position gaps).
+    Removed passages are tombstoned and dropped when the index is compacted.
+    The index is pickled as a snapshot plus an append-only log of per-video
+    updates, so an update costs one appended record rather than a rewrite of
+    the whole index; the log is folded into a new snapshot once it grows past
+    LOCAL_SEARCH_LOG_MAX_BYTES. Startup loads both and then reconciles the
+    captions dir against the stored file versions.
+    """
+
+    def __init__(self, index_path=None, captions_dir=None):
+        self.index_path = index_path or Config.LOCAL_SEARCH_INDEX_PATH
+        self.captions_dir = captions_dir or Config.CAPTIONS_DIR
+        self.log_path = self.index_path + '.log'
+        self.lock = threading.RLock()
+        # (st_ino, st_mtime_ns) of the snapshot in memory, and how far into the log it has been replayed
+        self.loaded_version = None
+        self.log_offset = 0
+        self.reset()
+
+        self.load()
+        self.sync_with_captions()
+
+    def reset(self):
+        self.postings = defaultdict(bytearray)
+        self.last_doc_for_term = {}
+        self.document_frequency = Counter()
+        # doc_id -> {chunk_id, video_id, passage_index, title, content, length}
+        self.documents = {}
+        self.video_documents = defaultdict(list)
+        self.video_versions = {}
+        self.deleted = set()
+        self.next_doc_id = 1
+        self.total_length = 0
+
+    # Persistence
+
+    def lock_file(self):
+        """Cross-process lock around read-modify-write of the index file"""
+        os.makedirs(os.path.dirname(self.index_path) or '.', exist_ok=True)
+        handle = open(self.index_path + '.lock', 'a')
+        if fcntl:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        return handle
+
+    def load(self):
+        try:
+            with open(self.index_path, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                state = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return False
+
+        if state.get('version') != INDEX_FORMAT_VERSION:
+            return False
+
+        self.reset()
+        self.postings = defaultdict(bytearray, state['postings'])
+        self.last_doc_for_term = state['last_doc_for_term']
+        self.document_frequency = Counter(state['document_frequency'])
+        self.documents = state['documents']
+        self.video_documents = defaultdict(list, state['video_documents'])
+        self.video_versions = state['video_versions']
+        self.deleted = state['deleted']
+        self.next_doc_id = state['next_doc_id']
+        self.total_length = state['total_length']
+        self.loaded_version = (stat.st_ino, stat.st_mtime_ns)
+        self.log_offset = 0
+        self.replay_log()
+        return True
+
+    def save(self):
+        state = {
+            'version': INDEX_FORMAT_VERSION,
+            'postings': dict(self.postings),
+            'last_doc_for_term': self.last_doc_for_term,
+            'document_frequency': dict(self.document_frequency),
+            'documents': self.documents,
+            'video_documents': dict(self.video_documents),
+            'video_versions': self.video_versions,
+            'deleted': self.deleted,
+            'next_doc_id': self.next_doc_id,
+            'total_length': self.total_length
+        }
+        temp_path = self.index_path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, self.index_path)
+        # The snapshot now covers everything in the log
+        open(self.log_path, 'wb').close()
+        stat = os.stat(self.index_path)
+        self.loaded_version = (stat.st_ino, stat.st_mtime_ns)
+        self.log_offset = 0
+
+    def replay_log(self):
+        """Apply log records appended since the last replay; a partly written tail is retried next time"""
+        try:
+            if os.path.getsize(self.log_path) <= self.log_offset:
+                return
+            with open(self.log_path, 'rb') as f:
+                f.seek(self.log_offset)
+                while True:
+                    try:
+                        record = pickle.load(f)
+                    except (EOFError, pickle.UnpicklingError, ValueError):
+                        break
+                    if record[0] == 'add':
+                        self._add_video(*record[1:])
+                    elif record[0] == 'remove':
+                        self._remove_video(record[1])
+                    self.log_offset = f.tell()
+        except OSError:
+            pass
+
+    def persist(self, records):
+        """Append update records to the log, or write a new snapshot when one is due"""
+        compacted = self._compact_if_needed()
+        if compacted or self.loaded_version is None or self.log_offset >= Config.LOCAL_SEARCH_LOG_MAX_BYTES:
+            self.save()
+            return
+        with open(self.log_path, 'ab') as f:
+            for record in records:
+                pickle.dump(record, f, protocol=pickle.HIGHEST_PROTOCOL)
+            self.log_offset = f.tell()
+
+    def reload_if_changed(self):
+        """Pick up updates saved by another process (e.g. the job worker)"""
+        try:
+            stat = os.stat(self.index_path)
+        except OSError:
+            return
+        if (stat.st_ino, stat.st_mtime_ns) != self.loaded_version:
+            self.load()
+        else:
+            self.replay_log()
+
+    def sync_with_captions(self):
+        """Index clean transcripts that changed on disk and drop ones that are gone"""
+        with self.lock:
+            handle = self.lock_file()
+            try:
+                self.reload_if_changed()
+                seen = set()
+                records = []
+
+                if os.path.exists(self.captions_dir):
+                    for entry in os.scandir(self.captions_dir):
+                        if not entry.name.endswith('_clean.txt'):
+                            continue
+                        video_id = entry.name[:-len('_clean.txt')]
+                        seen.add(video_id)
+                        version = (entry.stat().st_mtime_ns, entry.stat().st_size)
+                        if self.video_versions.get(video_id) != version:
+                            with open(entry.path, 'r', encoding='utf-8') as f:
+                                record = ('add', video_id, f"Video {video_id}", f.read(), version)
+                            self._add_video(*record[1:])
+                            records.append(record)
+
+                # Videos indexed without a local file (version None) live only in blob storage
+                for video_id, version in list(self.video_versions.items()):
+                    if version is not None and video_id not in seen:
+                        self._remove_video(video_id)
+                        records.append(('remove', video_id))
+
+                if records:
+                    self.persist(records)
+                    print(f"🔎 Local search index synced: {len(records)} transcripts updated")
+            finally:
+                handle.close()
+
+    # Updates
+
+    def _add_video(self, video_id, title, transcript, version=None):
+        self._remove_video(video_id)
+
+        passages = split_passages(transcript, Config.SEARCH_PASSAGE_TOKENS, Config.SEARCH_PASSAGE_OVERLAP_TOKENS)
+        for passage, key in zip(passages, make_passage_keys(video_id, passages)):
+            doc_id = self.next_doc_id
+            self.next_doc_id += 1
+
+            terms = tokenize(passage['content'])
+            positions = defaultdict(list)
+            for position, term in enumerate(terms):
+                positions[term].append(position)
+
+            for term, term_positions in positions.items():
+                out = self.postings[term]
+                encode_varint(doc_id - self.last_doc_for_term.get(term, 0), out)
+                encode_varint(len(term_positions), out)
+                previous = 0
+                for position in term_positions:
+                    encode_varint(position - previous, out)
+                    previous = position
+                self.last_doc_for_term[term] = doc_id
+                self.document_frequency[term] += 1
+
+            self.documents[doc_id] = {
+                'chunk_id': key,
+                'video_id': video_id,
+                'passage_index': passage['index'],
+                'title': title,
+                'content': passage['content'],
+                'length': len(terms)
+            }
+            self.video_documents[video_id].append(doc_id)
+            self.total_length += len(terms)
+
+        self.video_versions[video_id] = version
+
+    def _remove_video(self, video_id):
+        for doc_id in self.video_documents.pop(video_id, []):
+            document = self.documents.pop(doc_id, None)
+            if not document:
+                continue
+            for term in set(tokenize(document['content'])):
+                self.document_frequency[term] -= 1
+                if self.document_frequency[term] <= 0:
+                    del self.document_frequency[term]
+            self.total_length -= document['length']
+            self.deleted.add(doc_id)
+        self.video_versions.pop(video_id, None)
+
+    def _compact_if_needed(self):
+        """Rewrite posting lists without tombstoned documents once they pile up"""
+        live = len(self.documents)
+        if not self.deleted or len(self.deleted) < max(1000, live * 0.2):
+            return False
+
+        postings = defaultdict(bytearray)
+        last_doc_for_term = {}
+        for term, data in self.postings.items():
+            out = None
+            for doc_id, positions in iter_postings(data):
+                if doc_id in self.deleted:
+                    continue
+                if out is None:
+                    out = postings[term]
+                encode_varint(doc_id - last_doc_for_term.get(term, 0), out)
+                encode_varint(len(positions), out)
+                previous = 0
+                for position in positions:
+                    encode_varint(position - previous, out)
+                    previous = position
+                last_doc_for_term[term] = doc_id
+
+        self.postings = postings
+        self.last_doc_for_term = last_doc_for_term
+        self.deleted = set()
+        return True
+
+    def index_transcript(self, video_id, title, transcript, indexed_keys=None):
+        """Index (or re-index) a transcript, replacing its previous passages.
+
+        indexed_keys is accepted for parity with SearchService; the local
+        index already knows which passages a video has.
+        """
+        try:
+            if not video_id or not title or not transcript:
+                return {
+                    "success": False,
+                    "message": "Missing required fields: video_id, title, or transcript"
+                }
+
+            clean_path = os.path.join(self.captions_dir, f"{video_id}_clean.txt")
+            version = None
+            if os.path.exists(clean_path):
+                stat = os.stat(clean_path)
+                version = (stat.st_mtime_ns, stat.st_size)
+
+            with self.lock:
+                handle = self.lock_file()
+                try:
+                    self.reload_if_changed()
+                    self._add_video(video_id, title, transcript, version)
+                    self.persist([('add', video_id, title, transcript, version)])
+                finally:
+                    handle.close()
+
+            return {
+                "success": True,
+                "message": "Transcript indexed successfully",
+                "passages": len(self.video_documents.get(video_id, []))
+            }
+
+        except Exception as e:
+            error_msg = f"Exception during local indexing: {type(e).__name__}: {str(e)}"
+            print(f"❌ {error_msg}")
+            return {
+                "success": False,
+                "message": error_msg
+            }
+
+    def remove_transcript(self, video_id):
+        self.remove_transcripts([video_id])
+
+    def remove_transcripts(self, video_ids):
+        """Drop several videos with a single log append"""
+        with self.lock:
+            handle = self.lock_file()
+            try:
+                self.reload_if_changed()
+                records = []
+                for video_id in video_ids:
+                    if video_id in self.video_versions or video_id in self.video_documents:
+                        self._remove_video(video_id)
+                        records.append(('remove', video_id))
+                if records:
+                    self.persist(records)
+            finally:
+                handle.close()
+
+    def verify_index_exists(self):
+        return True
+
+    # Queries
+
+    def parse_query(self, query):
+        phrases = [tokenize(phrase) for phrase in PHRASE_PATTERN.findall(query)]
+        phrases = [phrase for phrase in phrases if phrase]
+        terms = tokenize(PHRASE_PATTERN.sub(' ', query))
+        for phrase in phrases:
+            terms.extend(phrase)
+        return list(dict.fromkeys(terms)), phrases
+
+    def _matches_phrase(self, doc_positions, phrase):
+        first = doc_positions.get(phrase[0])
+        if not first:
+            return False
+        for start in first:
+            if all(start + offset in doc_positions.get(term, ()) for offset, term in enumerate(phrase[1:], 1)):
+                return True
+        return False
+
+    def search_transcript(self, query, top=3):
+        """Search passages with BM25; quoted phrases must appear verbatim"""
+        try:
+            with self.lock:
+                self.reload_if_changed()
+                terms, phrases = self.parse_query(query)
+                live_count = len(self.documents)
+                if not terms or not live_count:
+                    return []
+
+                k1, b = 1.5, 0.75
+                average_length = self.total_length / live_count
+                scores = defaultdict(float)
+                # Positions are only kept for phrase terms, and only for candidate docs
+                phrase_terms = {term for phrase in phrases for term in phrase}
+                positions_by_doc = defaultdict(dict)
+
+                for term in terms:
+                    data = self.postings.get(term)
+                    df = self.document_frequency.get(term, 0)
+                    if not data or not df:
+                        continue
+                    idf = math.log(1 + (live_count - df + 0.5) / (df + 0.5))
+
+                    for doc_id, positions in iter_postings(data):
+                        if doc_id in self.deleted:
+                            continue
+                        length = self.documents[doc_id]['length']
+                        frequency = len(positions)
+                        norm = k1 * (1 - b + b * length / average_length)
+                        scores[doc_id] += idf * frequency * (k1 + 1) / (frequency + norm)
+                        if term in phrase_terms:
+                            positions_by_doc[doc_id][term] = set(positions)
+
+                if phrases:
+                    scores = {
+                        doc_id: score for doc_id, score in scores.items()
+                        if all(self._matches_phrase(positions_by_doc[doc_id], phrase) for phrase in phrases)
+                    }
+
+                ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top]
+
+                result_list = []
+                for doc_id, score in ranked:
+                    document = self.documents[doc_id]
+                    result_item = {
+                        "id": document['chunk_id'],
+                        "video_id": document['video_id'],
+                        "passage_index": document['passage_index'],
+                        "title": document['title'],
+                        "url": f"https://www.youtube.com/watch?v={document['video_id']}",
+                        "score": round(score, 4)
+                    }
+
+                    highlights = build_highlights(document['content'], set(terms))
+                    if highlights:
+                        result_item["highlights"] = highlights
+
+                    result_list.append(result_item)
+
+            print(f"Found {len(result_list)} results")
+            return result_list
+
+        except Exception as e:
+            print(f"Error searching local index: {str(e)}")
+            return {
+                "success": False,
+                "error": str(e)
+            }
+
+def build_highlights(content, terms, max_fragments=3):
+    """Lines with the most query terms, matches wrapped in <strong> like Azure highlights"""
+    def is_match(word):
+        token = word.lower()
+        return token in terms and token not in STOP_WORDS
+
+    scored_lines = []
+    for line in content.splitlines():
+        hits = sum(1 for word in TOKEN_PATTERN.findall(line.lower()) if is_match(word))
+        if hits:
+            scored_lines.append((hits, line))
+
+    scored_lines.sort(key=lambda item: item[0], reverse=True)
+
+    def wrap(match):
+        word = match.group(0)
+        return f"<strong>{word}</strong>" if is_match(word) else word
+
+    return [
+        re.sub(r"[A-Za-z0-9]+(?:'[A-Za-z]+)?", wrap, line)
+        for _, line in scored_lines[:max_fragments]
+    ]
@@ -0,0 +1,87 @@
+from datetime import datetime
+from sqlalchemy import func, text, update
+from azure_tennis_api.models import db, Match, MatchStat, ProcessingStatus
+
+COUNTER_NAMES = ['total'] + [status.value for status in ProcessingStatus] + ['indexed']
+
+def status_counter(status):
+    # Rows created before the column had a default count as pending
+    return (status or ProcessingStatus.PENDING).value
+
+def adjust_counters(deltas):
+    """Apply counter deltas in the caller's transaction; the caller commits"""
+    for name, delta in deltas.items():
+        if delta:
+            db.session.execute(
+                update(MatchStat)
+                .where(MatchStat.name == name)
+                .values(value=MatchStat.value + delta, updated_at=datetime.utcnow())
+            )
+
+def record_match_added(status, indexed=False):
+    adjust_counters({'total': 1, status_counter(status): 1, 'indexed': 1 if indexed else 0})
+
+def record_match_removed(status, indexed=False):
+    adjust_counters({'total': -1, status_counter(status): -1, 'indexed': -1 if indexed else 0})
+
+def record_status_change(old_status, new_status):
+    old_name = status_counter(old_status)
+    new_name = status_counter(new_status)
+    if old_name != new_name:
+        adjust_counters({old_name: -1, new_name: 1})
+
+def record_indexed_change(was_indexed, indexed):
+    if bool(was_indexed) != bool(indexed):
+        adjust_counters({'indexed': 1 if indexed else -1})
+
+def compute_match_stats():
+    """Exact counts from matches in one GROUP BY scan"""
+    rows = db.session.query(
+        Match.processing_status,
+        func.count(Match.id),
+        func.count(Match.id).filter(Match.azure_search_indexed == True)
+    ).group_by(Match.processing_status).all()
+
+    counts = dict.fromkeys(COUNTER_NAMES, 0)
+    for status, count, indexed_count in rows:
+        counts[status_counter(status)] += count
+        counts['total'] += count
+        counts['indexed'] += indexed_count
+    return counts
+
+def reconcile_match_stats():
+    """Recount matches and overwrite the counters, correcting any drift.
+
+    The exclusive lock makes concurrent increments wait until the recount
+    is committed, so they apply on top of it instead of being lost.
+    """
+    try:
+        db.session.execute(text("LOCK TABLE match_stats IN EXCLUSIVE MODE"))
+        counts = compute_match_stats()
+
+        existing = {stat.name: stat for stat in MatchStat.query.all()}
+        drift = {}
+        for name, value in counts.items():
+            stat = existing.get(name)
+            if stat is None:
+                db.session.add(MatchStat(name=name, value=value))
+            elif stat.value != value:
+                drift[name] = value - stat.value
+                stat.value = value
+
+        db.session.commit()
+        if drift:
+            print(f"⚠️ Match stats drifted, corrected: {drift}")
+        return counts
+
+    except Exception as e:
+        print(f"❌ Error reconciling match stats: {str(e)}")
+        db.session.rollback()
+        raise
+
+def get_match_stats():
+    """Current counters, one primary-key read regardless of table size"""
+    counts = {stat.name: stat.value for stat in MatchStat.query.all()}
+    if any(name not in counts for name in COUNTER_NAMES):
+        return reconcile_match_stats()
+    return counts
@@ -1,6 +1,11 @@
-import time
-from openai import AzureOpenAI
+import math
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from openai import AzureOpenAI, RateLimitError
 from azure_tennis_api.config import Config
+from azure_tennis_api.services.job_queue_service import JobCancelled
+from azure_tennis_api.services.rate_limiter import TokenBucketRateLimiter
+from azure_tennis_api.services.llm_cache import LLMCache
+from azure_tennis_api.services.transcript_chunker import chunk_transcript, count_tokens, get_input_budget, get_max_tokens
 
 # Initialize Azure OpenAI client
 client = AzureOpenAI(
@@ -9,7 +14,27 @@ client = AzureOpenAI(
     api_version=Config.AZURE_OPENAI_VERSION
 )
 
-def clean_transcript_with_llm(transcript_text, video_title):
+# Cleaning requests retry through the shared rate limiter instead of the SDK's own backoff
+limited_client = client.with_options(max_retries=0)
+
+# Shared by every cleaning job in this process so together they stay within the deployment quota
+rate_limiter = TokenBucketRateLimiter(
+    requests_per_minute=Config.AZURE_OPENAI_RPM,
+    tokens_per_minute=Config.AZURE_OPENAI_TPM
+)
+
+# Cleaned chunks are reused across re-runs, so reprocessing only pays for changed chunks
+CLEANING_TEMPERATURE = 0.3
+llm_cache = LLMCache()
+
+# How many times a truncated chunk is halved before its original text is kept
+MAX_SPLIT_DEPTH = 3
+
+class CompletionTruncated(Exception):
+    """The model hit max_tokens before finishing the cleaned text"""
+    pass
+
+def clean_transcript_with_llm(transcript_text, video_title, cancel_check=None):
     """Clean and improve the transcript using Azure OpenAI"""
     try:
         #system prompt
@@ -52,84 +77,152 @@ def clean_transcript_with_llm(transcript_text, video_title):
         Return ONLY the cleaned transcript that maintains all tennis analysis value while being properly formatted and readable. Do not add explanations, introductions, or commentary about the cleaning process.
         """
         
-        # Checks if transcript is too long
-        max_length = 12000
-        if len(transcript_text) > max_length:
-            return chunk_and_process_transcript(transcript_text, video_title, system_prompt)
+        # Checks if transcript fits in a single request
+        input_budget = get_input_budget(system_prompt)
+        transcript_tokens = count_tokens(transcript_text)
+        if transcript_tokens > input_budget:
+            return chunk_and_process_transcript(transcript_text, video_title, system_prompt, cancel_check)
         
         # Calls Azure OpenAI API
-        response = client.chat.completions.create(
-            model=Config.AZURE_OPENAI_DEPLOYMENT,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": transcript_text}
-            ],
-            temperature=0.3,
-            max_tokens=4000
-        )
+        cleaned = clean_text(system_prompt, transcript_text, transcript_tokens)
         
-        return response.choices[0].message.content.strip()
+        return cleaned if cleaned is not None else transcript_text
     
+    except JobCancelled:
+        raise
     except Exception as e:
         print(f"Error cleaning transcript: {str(e)}")
         return transcript_text
 
-def chunk_and_process_transcript(transcript_text, video_title, system_prompt):
+def chunk_and_process_transcript(transcript_text, video_title, system_prompt, cancel_check=None):
     """Process long transcripts by chunking them and processing each chunk separately"""
-    #chunk size in characters
-    chunk_size = 8000
-    
-    # Spliting transcript into chunks
-    words = transcript_text.split()
-    chunks = []
-    current_chunk = []
-    current_length = 0
-    
-    for word in words:
-        word_len = len(word) + 1
-        if current_length + word_len > chunk_size and current_chunk:
-            chunks.append(' '.join(current_chunk))
-            current_chunk = [word]
-            current_length = word_len
-        else:
-            current_chunk.append(word)
-            current_length += word_len
-    
-    if current_chunk:
-        chunks.append(' '.join(current_chunk))
+    # Chunks are packed up to the token budget at caption line or sentence boundaries
+    chunks = chunk_transcript(transcript_text, get_input_budget(system_prompt))
     
     print(f"Transcript split into {len(chunks)} chunks for processing")
     
-    # Process each chunk
-    processed_chunks = []
-    for i, chunk in enumerate(chunks):
-        print(f"Processing chunk {i+1}/{len(chunks)}...")
+    # Process chunks concurrently; results are stored by index so order is kept
+    processed_chunks = [None] * len(chunks)
+    executor = ThreadPoolExecutor(max_workers=Config.AZURE_OPENAI_MAX_CONCURRENCY)
+    
+    try:
+        futures = {
+            executor.submit(process_chunk, i, len(chunks), chunk, chunk_tokens, system_prompt): i
+            for i, (chunk, chunk_tokens) in enumerate(chunks)
+        }
         
-        chunk_prompt = f"""
-        This is part {i+1} of {len(chunks)} of a transcript. 
+        for future in as_completed(futures):
+            i = futures[future]
+            processed_chunks[i] = future.result()
+            print(f"Processed chunk {i+1}/{len(chunks)}")
+            
+            # Lets a background job stop between chunks
+            if cancel_check:
+                cancel_check()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+    
+    # Join processed chunks
+    return '\n\n'.join(processed_chunks)
+
+def process_chunk(i, total_chunks, chunk, chunk_tokens, system_prompt):
+    """Clean one chunk, keeping the original text if every attempt fails.
+
+    The prompt doesn't name the chunk's position or the chunk count: it is
+    part of the cache key, so the same chunk text hits the cache wherever it
+    falls after re-chunking.
+    """
+    chunk_prompt = f"""
+        This is one part of a longer transcript; it may start or end mid-conversation.
         {system_prompt}
         """
+    
+    cleaned = clean_text(chunk_prompt, chunk, chunk_tokens, label=f"chunk {i+1}")
+    
+    # Keep original chunk if processing fails
+    return cleaned if cleaned is not None else chunk
+
+def clean_text(system_prompt, text, text_tokens, label="transcript", depth=0):
+    """Clean text in one completion, halving it and cleaning the parts when the output is truncated.
+
+    Returns None if the completion fails. A part that is still truncated
+    after MAX_SPLIT_DEPTH halvings keeps its original text.
+    """
+    try:
+        return complete_with_rate_limit(system_prompt, text, get_max_tokens(text_tokens), label=label)
+    except CompletionTruncated:
+        parts = chunk_transcript(text, math.ceil(text_tokens / 2))
+        if depth >= MAX_SPLIT_DEPTH or len(parts) < 2:
+            print(f"Output for {label} is still truncated, keeping its original text")
+            return None
+        print(f"Output for {label} was truncated, cleaning it in {len(parts)} parts")
+    
+    cleaned_parts = []
+    for j, (part, part_tokens) in enumerate(parts):
+        cleaned = clean_text(system_prompt, part, part_tokens, label=f"{label}.{j+1}", depth=depth + 1)
+        cleaned_parts.append(cleaned if cleaned is not None else part)
+    return '\n'.join(cleaned_parts)
+
+def complete_with_rate_limit(system_prompt, text, max_tokens, label="transcript"):
+    """Run one cleaning completion through the cache and shared rate limiter, retrying on 429.
+
+    Raises CompletionTruncated when the model stops at max_tokens, so a
+    cut-off cleaning is never returned or cached as a success.
+    """
+    cache_key = LLMCache.make_key(text, system_prompt, Config.AZURE_OPENAI_DEPLOYMENT, CLEANING_TEMPERATURE)
+    cached = llm_cache.get(cache_key)
+    if cached is not None:
+        print(f"Cache hit for {label}")
+        return cached
+    
+    for attempt in range(Config.AZURE_OPENAI_MAX_RETRIES + 1):
+        # Azure charges max_tokens against the TPM quota up front
+        rate_limiter.acquire(count_tokens(system_prompt) + count_tokens(text) + max_tokens)
         
         try:
-            if i > 0:
-                time.sleep(1)
-                
-            response = client.chat.completions.create(
+            response = limited_client.chat.completions.create(
                 model=Config.AZURE_OPENAI_DEPLOYMENT,
                 messages=[
-                    {"role": "system", "content": chunk_prompt},
-                    {"role": "user", "content": chunk}
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": text}
                 ],
-                temperature=0.3,
-                max_tokens=4000
+                temperature=CLEANING_TEMPERATURE,
+                max_tokens=max_tokens
             )
             
-            processed_chunks.append(response.choices[0].message.content.strip())
+            choice = response.choices[0]
+            if choice.finish_reason != 'length':
+                cleaned = choice.message.content.strip()
+                # Only completions that ended naturally are cached; anything else is retried on the next run
+                if choice.finish_reason == 'stop':
+                    llm_cache.put(cache_key, cleaned)
+                return cleaned
+        
+        except RateLimitError as e:
+            retry_after = get_retry_after(e)
+            print(f"Rate limited on {label}, retrying in {retry_after:.1f}s")
+            rate_limiter.pause(retry_after)
         
         except Exception as e:
-            print(f"Error processing chunk {i+1}: {str(e)}")
-            # Keep original chunk if processing fails
-            processed_chunks.append(chunk)
+            print(f"Error processing {label}: {str(e)}")
+            return None
+        
+        else:
+            raise CompletionTruncated(f"Output for {label} reached max_tokens={max_tokens}")
     
-    # Join processed chunks
-    return '\n\n'.join(processed_chunks)
\ No newline at end of file
+    print(f"Giving up on {label} after {Config.AZURE_OPENAI_MAX_RETRIES} retries")
+    return None
+
+def get_retry_after(error, default=10.0):
+    """Read the Retry-After delay from a 429 response"""
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000.0
+        if headers.get('retry-after'):
+            return float(headers['retry-after'])
+    except (TypeError, ValueError):
+        pass
+    
+    return default
@@ -0,0 +1,530 @@
+import hashlib
+import re
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+from azure_tennis_api.config import Config
+from azure_tennis_api.models import db, Match, ProcessingStatus
+from azure_tennis_api.services.blob_storage_service import BlobStorageService
+from azure_tennis_api.services.transcript_cache import TranscriptCache
+from azure_tennis_api.services.transcript_store import TranscriptStore
+from azure_tennis_api.services.search_service import SearchService, get_search_service, build_passage_documents, iter_batches
+from azure_tennis_api.services.youtube_service import get_transcript, get_video_metadata, get_video_title
+from azure_tennis_api.services.openai_service import clean_transcript_with_llm
+from azure_tennis_api.services.embedding_service import get_vector_store
+from azure_tennis_api.services.match_stats_service import (
+    adjust_counters,
+    record_indexed_change,
+    record_match_added,
+    record_status_change
+)
+
+blob_service = BlobStorageService()
+transcript_cache = TranscriptCache(blob_service)
+transcript_store = TranscriptStore(transcript_cache)
+
+# Clean transcripts read per batched store call during a backfill
+BACKFILL_READ_BATCH = 64
+
+NOT_INDEXED = db.or_(Match.azure_search_indexed == False, Match.azure_search_indexed.is_(None))
+
+def create_or_update_match(video_id, title=None):
+    try:
+        # Row lock so a concurrent transition can't count the same old status
+        existing_match = Match.query.filter_by(video_id=video_id).with_for_update().populate_existing().first()
+
+        if existing_match:
+            print(f"Match already exists for video {video_id}, updating status...")
+            record_status_change(existing_match.processing_status, ProcessingStatus.PROCESSING)
+            existing_match.processing_status = ProcessingStatus.PROCESSING
+            existing_match.updated_at = datetime.utcnow()
+            if title and not existing_match.title:
+                existing_match.title = title
+            db.session.commit()
+            return existing_match
+
+        # Cached after the first lookup, so this is usually a primary-key read
+        metadata = get_video_metadata([video_id]).get(video_id) or {}
+        if not title:
+            title = metadata.get('title') or f"Unknown Title ({video_id})"
+
+        players = extract_players_from_title(title)
+        tournament = extract_tournament_from_title(title)
+
+        new_match = Match(
+            video_id=video_id,
+            title=title,
+            players=players,
+            tournament=tournament,
+            duration_seconds=metadata.get('duration_seconds'),
+            processing_status=ProcessingStatus.PROCESSING,
+            created_at=datetime.utcnow(),
+            updated_at=datetime.utcnow()
+        )
+
+        db.session.add(new_match)
+        record_match_added(new_match.processing_status)
+        db.session.commit()
+
+        print(f"✅ Created new match record for {video_id}: {title}")
+        return new_match
+
+    except Exception as e:
+        print(f"❌ Error creating/updating match: {str(e)}")
+        db.session.rollback()
+        return None
+
+def update_match_status(video_id, status, error_message=None):
+    try:
+        # Row lock so concurrent transitions can't both count the same old status
+        match = Match.query.filter_by(video_id=video_id).with_for_update().populate_existing().first()
+
+        if not match:
+            print(f"⚠️ No match found for video_id: {video_id}")
+            return False
+
+        record_status_change(match.processing_status, status)
+        match.processing_status = status
+        match.updated_at = datetime.utcnow()
+
+        if error_message:
+            match.error_message = error_message
+
+        db.session.commit()
+        print(f"✅ Updated match {video_id} status to {status.value}")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error updating match status: {str(e)}")
+        db.session.rollback()
+        return False
+
+def mark_match_indexed(video_id, indexed=True, passage_keys=None):
+    """Set the indexed flag and record the indexed passage keys (None when unknown)"""
+    try:
+        # Row lock so concurrent updates can't both count the same change
+        match = Match.query.filter_by(video_id=video_id).with_for_update().populate_existing().first()
+
+        if not match:
+            print(f"⚠️ No match found for video_id: {video_id}")
+            return False
+
+        record_indexed_change(match.azure_search_indexed, indexed)
+        match.azure_search_indexed = indexed
+        match.search_passage_keys = passage_keys
+        match.updated_at = datetime.utcnow()
+
+        db.session.commit()
+        print(f"✅ Updated match {video_id} indexing status to {indexed}")
+        return True
+
+    except Exception as e:
+        print(f"❌ Error updating match indexing status: {str(e)}")
+        db.session.rollback()
+        return False
+
+def get_search_passage_keys(video_id):
+    """Passage keys recorded at the last successful index of a video, or None"""
+    try:
+        return db.session.query(Match.search_passage_keys).filter_by(video_id=video_id).scalar()
+    except Exception as e:
+        print(f"Error getting indexed passage keys: {str(e)}")
+        db.session.rollback()
+        return None
+
+def hash_transcript(content):
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+def transcript_lexemes(content):
+    """SQL expression for the searchable lexemes of a transcript, positions stripped to keep the row small"""
+    return db.func.strip(db.func.to_tsvector('english', content))
+
+def record_transcript(video_id, content, is_clean):
+    """Store size, hash and availability of a transcript just written, so listings needn't read it"""
+    try:
+        match = Match.query.filter_by(video_id=video_id).first()
+
+        if not match:
+            print(f"⚠️ No match found for video_id: {video_id}")
+            return False
+
+        if is_clean:
+            match.has_clean_transcript = True
+        else:
+            match.has_raw_transcript = True
+
+        # Listings describe the clean transcript once there is one
+        if is_clean or not match.has_clean_transcript:
+            match.transcript_length = len(content)
+            match.transcript_hash = hash_transcript(content)
+            match.transcript_tsv = transcript_lexemes(content)
+
+        match.updated_at = datetime.utcnow()
+        db.session.commit()
+        return True
+
+    except Exception as e:
+        print(f"❌ Error recording transcript metadata: {str(e)}")
+        db.session.rollback()
+        return False
+
+def read_transcript_metadata(video_ids):
+    """Transcript metadata read from the store, for matches created from existing files.
+
+    Returns {video_id: metadata}, reading the clean transcript where there
+    is one and the raw one otherwise, each kind in one batched call.
+    """
+    clean = transcript_store.get_many(video_ids, is_clean=True)
+    raw = transcript_store.get_many(video_ids, is_clean=False)
+
+    metadata = {}
+    for video_id in clean:
+        result = clean[video_id] if clean[video_id]['success'] else raw[video_id]
+        content = result.get('content')
+        metadata[video_id] = {
+            'has_raw_transcript': raw[video_id]['success'],
+            'has_clean_transcript': clean[video_id]['success'],
+            'transcript_length': len(content) if content is not None else None,
+            'transcript_hash': hash_transcript(content) if content is not None else None,
+            'transcript_tsv': transcript_lexemes(content) if content is not None else None
+        }
+
+    return metadata
+
+def get_match_title(video_id):
+    """Title stored on the match record, without calling YouTube"""
+    try:
+        match = Match.query.filter_by(video_id=video_id).first()
+        if match and match.title:
+            return match.title
+        else:
+            return f"Video {video_id}"
+    except Exception as e:
+        print(f"Error getting video title: {str(e)}")
+        return f"Video {video_id}"
+
+def extract_players_from_title(title):
+    players = []
+
+    if not title:
+        return players
+
+    patterns = [
+        r'([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)\s+vs?\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)',
+        r'([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)\s+v\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)',
+        r'([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)\s+-\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+)*)',
+    ]
+
+    for pattern in patterns:
+        match = re.search(pattern, title)
+        if match:
+            player1 = match.group(1).strip()
+            player2 = match.group(2).strip()
+
+            non_players = ['highlights', 'match', 'final', 'semi', 'quarter', 'atp', 'wta', 'tennis']
+
+            if player1.lower() not in non_players and len(player1) > 2:
+                players.append(player1)
+            if player2.lower() not in non_players and len(player2) > 2:
+                players.append(player2)
+
+            break
+
+    return players
+
+def extract_tournament_from_title(title):
+    if not title:
+        return None
+
+    title_lower = title.lower()
+
+    tournaments = [
+        'wimbledon', 'roland garros', 'french open', 'us open', 'australian open',
+        'miami open', 'indian wells', 'masters', 'atp finals', 'wta finals',
+        'roland-garros', 'cincinnati', 'toronto', 'madrid', 'rome', 'monte carlo'
+    ]
+
+    for tournament in tournaments:
+        if tournament in title_lower:
+            return tournament.title()
+
+    tournament_pattern = r'(\d{4}\s+[A-Z][a-zA-Z\s]+(?:Open|Masters|Cup|Championship))'
+    match = re.search(tournament_pattern, title)
+    if match:
+        return match.group(1).strip()
+
+    return None
+
+def extract_video(video_id, video_title=None):
+    """Fetch the YouTube transcript for a video and store the raw copy"""
+    if not video_title:
+        video_title = get_video_title(video_id)
+
+    match_record = create_or_update_match(video_id, video_title)
+    transcript_result = get_transcript(video_id)
+
+    if not transcript_result['success']:
+        if match_record:
+            update_match_status(video_id, ProcessingStatus.FAILED, transcript_result.get('error'))
+
+        return {
+            "success": False,
+            "video_id": video_id,
+            "title": video_title,
+            "error": transcript_result.get('error', 'Unknown error'),
+            "match_id": match_record.id if match_record else None
+        }
+
+    transcript_store.put(video_id, transcript_result['transcript'], is_clean=False)
+    record_transcript(video_id, transcript_result['transcript'], is_clean=False)
+
+    if match_record:
+        update_match_status(video_id, ProcessingStatus.PROCESSING)
+
+    return {
+        "success": True,
+        "video_id": video_id,
+        "title": video_title,
+        "match_id": match_record.id if match_record else None
+    }
+
+def clean_video(video_id, cancel_check=None):
+    """Clean the raw transcript of a video with Azure OpenAI and store the result"""
+    transcript_result = transcript_store.get(video_id, is_clean=False)
+
+    if not transcript_result['success']:
+        update_match_status(video_id, ProcessingStatus.FAILED, "No transcript file found")
+
+        return {
+            "success": False,
+            "video_id": video_id,
+            "error": f"No transcript file found for video ID: {video_id}"
+        }
+
+    transcript_text = transcript_result['content']
+    print(f"Retrieved transcript for video ID: {video_id} ({transcript_result['source']})")
+
+    video_title = get_video_title(video_id)
+    print(f"Processing video: {video_title} (ID: {video_id})")
+
+    print("Cleaning transcript with Azure OpenAI...")
+    cleaned_transcript = clean_transcript_with_llm(transcript_text, video_title, cancel_check=cancel_check)
+
+    transcript_store.put(video_id, cleaned_transcript, is_clean=True)
+    record_transcript(video_id, cleaned_transcript, is_clean=True)
+
+    update_match_status(video_id, ProcessingStatus.COMPLETED)
+
+    # The local engine is in-process, so keep it current as soon as a transcript is cleaned
+    if Config.SEARCH_BACKEND == 'local':
+        index_result = get_search_service().index_transcript(video_id, video_title, cleaned_transcript) or {}
+        if index_result.get("success", False):
+            mark_match_indexed(video_id, True)
+
+    return {
+        "success": True,
+        "video_id": video_id,
+        "title": video_title,
+        "clean_length": len(cleaned_transcript)
+    }
+
+def index_video(video_id):
+    """Upload the clean transcript of a video to Azure AI Search"""
+    transcript_result = transcript_store.get(video_id, is_clean=True)
+
+    if not transcript_result['success']:
+        return {
+            "success": False,
+            "video_id": video_id,
+            "error": f"Clean transcript not found for video ID: {video_id}"
+        }
+
+    video_title = get_match_title(video_id)
+    content = transcript_result['content']
+
+    search_service = get_search_service()
+    result = search_service.index_transcript(video_id, video_title, content, indexed_keys=get_search_passage_keys(video_id)) or {}
+
+    if result.get("success", False):
+        mark_match_indexed(video_id, True, result.get("keys"))
+        return {
+            "success": True,
+            "video_id": video_id,
+            "title": video_title
+        }
+
+    mark_match_indexed(video_id, False)
+    return {
+        "success": False,
+        "video_id": video_id,
+        "title": video_title,
+        "error": result.get('message', 'Unknown error')
+    }
+
+def embed_video(video_id):
+    """Embed the passages of a clean transcript into the local vector store"""
+    transcript_result = transcript_store.get(video_id, is_clean=True)
+
+    if not transcript_result['success']:
+        return {
+            "success": False,
+            "video_id": video_id,
+            "error": f"Clean transcript not found for video ID: {video_id}"
+        }
+
+    video_title = get_match_title(video_id)
+
+    return get_vector_store().embed_transcript(video_id, video_title, transcript_result['content'])
+
+def follow_up_stages(*stages):
+    """Stages to chain after cleaning, with embedding added when enabled"""
+    stages = list(stages)
+    if Config.EMBEDDINGS_ENABLED:
+        stages.append('embed')
+    return stages
+
+def backfill_search_index(limit=None, cancel_check=None):
+    """Index every completed match that is not in Azure AI Search yet.
+
+    Passages from many matches are packed into shared upload batches and a
+    few batches are sent concurrently. A match is flagged as indexed, with
+    one UPDATE per batch, once all of its passages have been accepted.
+    Documents are uploaded without the stale-passage cleanup done by
+    index_video, so re-index a match individually if its transcript shrank.
+    """
+    search_service = get_search_service()
+    if not search_service.verify_index_exists():
+        return {
+            "success": False,
+            "error": "Failed to connect to existing index"
+        }
+
+    if not isinstance(search_service, SearchService):
+        return backfill_local_index(search_service, limit)
+
+    # Load the small id/title rows up front so commits below don't interrupt the cursor
+    query = db.session.query(Match.id, Match.video_id, Match.title).filter(
+        Match.processing_status == ProcessingStatus.COMPLETED,
+        NOT_INDEXED
+    ).order_by(Match.id)
+    if limit:
+        query = query.limit(limit)
+    candidates = query.all()
+    db.session.commit()
+
+    print(f"🔄 Backfilling search index for {len(candidates)} matches")
+
+    include_index = search_service.get_schema()["has_passage_index"]
+    pending = {}
+    in_flight = {}
+    stats = {"matches": len(candidates), "indexed": 0, "failed": 0, "missing_transcript": 0, "batches": 0, "documents": 0}
+
+    def documents():
+        for start in range(0, len(candidates), BACKFILL_READ_BATCH):
+            batch = candidates[start:start + BACKFILL_READ_BATCH]
+            transcripts = transcript_store.get_many([video_id for _, video_id, _ in batch], is_clean=True)
+
+            for match_id, video_id, title in batch:
+                transcript_result = transcripts[video_id]
+                if not transcript_result['success']:
+                    stats["missing_transcript"] += 1
+                    continue
+
+                match_documents = build_passage_documents(video_id, title or f"Video {video_id}", transcript_result['content'], include_index)
+                if not match_documents:
+                    continue
+
+                pending[video_id] = {"match_id": match_id, "remaining": len(match_documents), "failed": False}
+                yield from match_documents
+
+    def finish(future):
+        batch = in_flight.pop(future)
+        try:
+            succeeded = {result.key: result.succeeded for result in future.result()}
+        except Exception as e:
+            print(f"❌ Batch upload failed: {str(e)}")
+            succeeded = {}
+
+        indexed_ids = []
+        for document in batch:
+            state = pending[document["parent_id"]]
+            state["remaining"] -= 1
+            if not succeeded.get(document["chunk_id"], False):
+                state["failed"] = True
+            if state["remaining"] == 0:
+                del pending[document["parent_id"]]
+                if state["failed"]:
+                    stats["failed"] += 1
+                else:
+                    indexed_ids.append(state["match_id"])
+
+        if indexed_ids:
+            newly_indexed = Match.query.filter(Match.id.in_(indexed_ids), NOT_INDEXED).update(
+                {Match.azure_search_indexed: True, Match.updated_at: datetime.utcnow()},
+                synchronize_session=False
+            )
+            adjust_counters({'indexed': newly_indexed})
+            db.session.commit()
+            stats["indexed"] += len(indexed_ids)
+
+    max_workers = Config.SEARCH_BACKFILL_CONCURRENCY
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for batch in iter_batches(documents(), Config.SEARCH_BATCH_MAX_DOCUMENTS, Config.SEARCH_BATCH_MAX_BYTES):
+            # Keep only a bounded number of batches in memory
+            while len(in_flight) >= max_workers * 2:
+                done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                for future in done:
+                    finish(future)
+
+            in_flight[executor.submit(search_service.search_client.upload_documents, documents=batch)] = batch
+            stats["batches"] += 1
+            stats["documents"] += len(batch)
+
+            if cancel_check:
+                cancel_check()
+
+        while in_flight:
+            done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+            for future in done:
+                finish(future)
+
+    print(f"✅ Backfill finished: {stats['indexed']} indexed, {stats['failed']} failed, {stats['missing_transcript']} without clean transcript")
+    return dict(stats, success=True)
+
+def backfill_local_index(search_service, limit=None):
+    """Backfill for the local engine, which has no network batches to pack"""
+    query = db.session.query(Match.video_id, Match.title).filter(
+        Match.processing_status == ProcessingStatus.COMPLETED,
+        NOT_INDEXED
+    ).order_by(Match.id)
+    if limit:
+        query = query.limit(limit)
+    candidates = query.all()
+
+    indexed_video_ids = []
+    stats = {"matches": len(candidates), "indexed": 0, "failed": 0, "missing_transcript": 0}
+
+    transcripts = transcript_store.get_many([video_id for video_id, _ in candidates], is_clean=True)
+
+    for video_id, title in candidates:
+        transcript_result = transcripts[video_id]
+        if not transcript_result['success']:
+            stats["missing_transcript"] += 1
+            continue
+
+        result = search_service.index_transcript(video_id, title or f"Video {video_id}", transcript_result['content'])
+
+        if result.get("success", False):
+            indexed_video_ids.append(video_id)
+        else:
+            stats["failed"] += 1
+
+    if indexed_video_ids:
+        newly_indexed = Match.query.filter(Match.video_id.in_(indexed_video_ids), NOT_INDEXED).update(
+            {Match.azure_search_indexed: True, Match.updated_at: datetime.utcnow()},
+            synchronize_session=False
+        )
+        adjust_counters({'indexed': newly_indexed})
+        db.session.commit()
+        stats["indexed"] = len(indexed_video_ids)
+
+    return dict(stats, success=True)
@@ -0,0 +1,60 @@
+import threading
+import time
+
+class TokenBucketRateLimiter:
+    """Thread-safe limiter for an Azure OpenAI deployment quota.
+
+    Keeps two buckets that refill continuously: one for requests per minute
+    and one for tokens per minute. A caller blocks in acquire() until both
+    buckets hold enough capacity for its request. A 429 response pauses
+    every caller until the Retry-After time has passed.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.request_capacity = float(requests_per_minute)
+        self.token_capacity = float(tokens_per_minute)
+        self.request_rate = self.request_capacity / 60.0
+        self.token_rate = self.token_capacity / 60.0
+
+        self.available_requests = self.request_capacity
+        self.available_tokens = self.token_capacity
+        self.blocked_until = 0.0
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self.last_refill
+        self.available_requests = min(self.request_capacity, self.available_requests + elapsed * self.request_rate)
+        self.available_tokens = min(self.token_capacity, self.available_tokens + elapsed * self.token_rate)
+        self.last_refill = now
+
+    def acquire(self, tokens):
+        """Block until one request costing the given tokens fits the quota"""
+        # A single request larger than the whole bucket would wait forever
+        tokens = min(float(tokens), self.token_capacity)
+
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+
+                if now < self.blocked_until:
+                    wait = self.blocked_until - now
+                elif self.available_requests >= 1 and self.available_tokens >= tokens:
+                    self.available_requests -= 1
+                    self.available_tokens -= tokens
+                    return
+                else:
+                    request_wait = max(0.0, (1 - self.available_requests) / self.request_rate)
+                    token_wait = max(0.0, (tokens - self.available_tokens) / self.token_rate)
+                    wait = max(request_wait, token_wait)
+
+            time.sleep(min(max(wait, 0.01), 5.0))
+
+    def pause(self, seconds):
+        """Stop handing out capacity for the given number of seconds"""
+        with self.lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+            # Whatever was left in the buckets was evidently not really available
+            self.available_requests = 0.0
+            self.available_tokens = 0.0
@@ -0,0 +1,122 @@
+import math
+import re
+import threading
+from collections import Counter, OrderedDict
+from azure_tennis_api.config import Config
+from azure_tennis_api.services.transcript_chunker import split_passages
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+STOP_WORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'but', 'by', 'did', 'do', 'does', 'for', 'from',
+    'had', 'has', 'have', 'he', 'her', 'his', 'how', 'i', 'in', 'is', 'it', 'its', 'me', 'of',
+    'on', 'or', 'she', 'so', 'that', 'the', 'their', 'them', 'there', 'they', 'this', 'to',
+    'was', 'we', 'were', 'what', 'when', 'where', 'which', 'who', 'why', 'with', 'you', 'your'
+}
+
+def tokenize(text):
+    return [term for term in TOKEN_PATTERN.findall(text.lower()) if term not in STOP_WORDS]
+
+class BM25Index:
+    """Okapi BM25 over the passages of one transcript"""
+
+    def __init__(self, passages, k1=1.5, b=0.75):
+        self.passages = passages
+        self.k1 = k1
+        self.b = b
+
+        self.term_frequencies = [Counter(tokenize(passage['content'])) for passage in passages]
+        self.lengths = [sum(tf.values()) for tf in self.term_frequencies]
+        self.average_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0
+
+        document_frequency = Counter()
+        for tf in self.term_frequencies:
+            document_frequency.update(tf.keys())
+
+        count = len(passages)
+        self.idf = {
+            term: math.log(1 + (count - df + 0.5) / (df + 0.5))
+            for term, df in document_frequency.items()
+        }
+
+    def score(self, query):
+        terms = [term for term in set(tokenize(query)) if term in self.idf]
+        scores = []
+
+        for tf, length in zip(self.term_frequencies, self.lengths):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / self.average_length) if self.average_length else self.k1
+            for term in terms:
+                frequency = tf.get(term)
+                if frequency:
+                    score += self.idf[term] * frequency * (self.k1 + 1) / (frequency + norm)
+            scores.append(score)
+
+        return scores
+
+class PassageRetriever:
+    """Keeps BM25 indexes for recently used transcripts in memory"""
+
+    def __init__(self, max_transcripts=32):
+        self.max_transcripts = max_transcripts
+        self.indexes = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get_index(self, video_id, load_content, version):
+        """BM25 index for a transcript, loaded and rebuilt only when its version changes"""
+        cache_key = (video_id, version)
+
+        with self.lock:
+            index = self.indexes.get(cache_key)
+            if index is not None:
+                self.indexes.move_to_end(cache_key)
+                return index
+
+        passages = split_passages(load_content(), Config.PASSAGE_TOKENS, Config.PASSAGE_OVERLAP_TOKENS)
+        index = BM25Index(passages)
+
+        with self.lock:
+            # Drop older versions of the same transcript along with LRU overflow
+            for key in [key for key in self.indexes if key[0] == video_id]:
+                del self.indexes[key]
+            self.indexes[cache_key] = index
+            while len(self.indexes) > self.max_transcripts:
+                self.indexes.popitem(last=False)
+
+        return index
+
+    def retrieve(self, video_id, query, load_content, version, top_k=None, token_budget=None):
+        """Top-k passages for a question, trimmed to a token budget and in transcript order"""
+        if top_k is None:
+            top_k = Config.CHAT_TOP_K
+        if token_budget is None:
+            token_budget = Config.CHAT_CONTEXT_TOKEN_BUDGET
+
+        index = self.get_index(video_id, load_content, version)
+        passages = index.passages
+        if not passages:
+            return []
+
+        scores = index.score(query)
+        ranked = sorted(range(len(passages)), key=lambda i: scores[i], reverse=True)
+        ranked = [i for i in ranked if scores[i] > 0]
+
+        if not ranked:
+            # Nothing matched (e.g. "summarise the match"); sample evenly across the transcript
+            step = max(1, len(passages) // max(1, top_k))
+            ranked = list(range(0, len(passages), step))
+
+        selected = []
+        used_tokens = 0
+        for i in ranked[:top_k]:
+            if used_tokens + passages[i]['tokens'] > token_budget and selected:
+                continue
+            selected.append(i)
+            used_tokens += passages[i]['tokens']
+
+        return [
+            dict(passages[i], score=round(scores[i], 4))
+            for i in sorted(selected)
+        ]
+
+passage_retriever = PassageRetriever()
@@ -1,65 +1,160 @@
-import os
+import hashlib
+import json
+import threading
+import time
+from collections import Counter
+import requests
+from requests.adapters import HTTPAdapter
 from azure.core.credentials import AzureKeyCredential
-from azure.search.documents import SearchClient
+from azure.core.exceptions import HttpResponseError
+from azure.core.pipeline.transport import RequestsTransport
+from azure.search.documents import SearchClient, IndexDocumentsBatch
 from azure.search.documents.indexes import SearchIndexClient
-from azure.search.documents.indexes.models import (
-    SearchIndex, 
-    SimpleField, 
-    SearchableField,
-    SearchFieldDataType
-)
 from azure_tennis_api.config import Config
+from azure_tennis_api.services.transcript_chunker import split_passages
+
+def make_passage_key(video_id, content, occurrence=0):
+    """Stable document key from the passage content alone, so a passage keeps its key when others shift.
+
+    occurrence tells apart identical passages within one transcript.
+    """
+    content_hash = hashlib.sha1(content.encode('utf-8')).hexdigest()[:16]
+    key = f"{video_id}_{content_hash}"
+    return f"{key}_{occurrence}" if occurrence else key
+
+def make_passage_keys(video_id, passages):
+    """Keys for a transcript's passages, in order"""
+    seen = Counter()
+    keys = []
+    for passage in passages:
+        keys.append(make_passage_key(video_id, passage['content'], seen[passage['content']]))
+        seen[passage['content']] += 1
+    return keys
+
+def build_passage_documents(video_id, title, transcript, include_index=False):
+    """Map each passage to the existing index schema, all sharing the video as parent.
+
+    passage_index is only sent when the index has that field.
+    """
+    passages = split_passages(transcript, Config.SEARCH_PASSAGE_TOKENS, Config.SEARCH_PASSAGE_OVERLAP_TOKENS)
+    documents = []
+    for passage, key in zip(passages, make_passage_keys(video_id, passages)):
+        document = {
+            "chunk_id": key,
+            "parent_id": str(video_id),
+            "content": passage['content'],
+            "title": str(title)[:1000],
+            "url": f"https://www.youtube.com/watch?v={video_id}", # YouTube URL
+            "filepath": f"youtube/{video_id}.txt",
+        }
+        if include_index:
+            document["passage_index"] = passage['index']
+        documents.append(document)
+    return documents
+
+def escape_filter_value(value):
+    return str(value).replace("'", "''")
+
+def iter_batches(documents, max_documents, max_bytes, size_of=None):
+    """Group documents so each batch stays under both the count and payload size limits"""
+    batch = []
+    batch_bytes = 0
+    for document in documents:
+        document_bytes = len(json.dumps(size_of(document) if size_of else document).encode('utf-8'))
+        if batch and (len(batch) >= max_documents or batch_bytes + document_bytes > max_bytes):
+            yield batch
+            batch = []
+            batch_bytes = 0
+        batch.append(document)
+        batch_bytes += document_bytes
+    if batch:
+        yield batch
 
 class SearchService:
+    """Azure AI Search access shared by the whole process.
+
+    Both SDK clients share one pooled HTTP session, and the index schema is
+    fetched once and cached for SEARCH_SCHEMA_TTL_SECONDS, so index and
+    search calls don't pay for client setup or a get_index round trip.
+    Use get_search_service() rather than constructing this directly.
+    """
+
     def __init__(self):
         self.endpoint = Config.AZURE_SEARCH_ENDPOINT
         self.key = Config.AZURE_SEARCH_KEY
         self.index_name = Config.AZURE_SEARCH_INDEX_NAME
         
+        # One keep-alive connection pool for both clients
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=Config.SEARCH_HTTP_POOL_SIZE)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        
+        credential = AzureKeyCredential(self.key)
+        
         # Create SearchIndexClient
         self.index_client = SearchIndexClient(
             endpoint=self.endpoint,
-            credential=AzureKeyCredential(self.key)
+            credential=credential,
+            transport=RequestsTransport(session=self.session, session_owner=False)
         )
         
         # Create SearchClient
         self.search_client = SearchClient(
             endpoint=self.endpoint,
             index_name=self.index_name,
-            credential=AzureKeyCredential(self.key)
+            credential=credential,
+            transport=RequestsTransport(session=self.session, session_owner=False)
         )
         
+        self.schema = None
+        self.schema_fetched_at = 0
+        self.schema_lock = threading.Lock()
+    
+    def get_schema(self, force_refresh=False):
+        """Cached index schema, fetched again after the TTL or when forced"""
+        with self.schema_lock:
+            expired = time.monotonic() - self.schema_fetched_at > Config.SEARCH_SCHEMA_TTL_SECONDS
+            if self.schema is None or expired or force_refresh:
+                self.schema = self.fetch_schema()
+                self.schema_fetched_at = time.monotonic()
+            return self.schema
+    
+    def invalidate_schema(self):
+        with self.schema_lock:
+            self.schema = None
+    
+    def fetch_schema(self):
+        # Get the specific index to verify it exists and check its schema
+        index = self.index_client.get_index(self.index_name)
+        print(f"✅ Successfully connected to existing index: {self.index_name}")
+        
+        field_names = [field.name for field in index.fields]
+        key_field = next((field.name for field in index.fields if field.key), None)
+        print(f"📋 Index has {len(field_names)} fields: {', '.join(field_names)}")
+        
+        # Check if required fields exist
+        required_fields = ['chunk_id', 'parent_id', 'title', 'content']
+        missing_fields = [field for field in required_fields if field not in field_names]
+        
+        if missing_fields:
+            print(f"Warning: Missing expected fields: {missing_fields}")
+            print("You may need to adjust your document structure")
+        
+        if key_field:
+            print(f"🔑 Key field: {key_field}")
+        else:
+            print("⚠️ Warning: No key field found")
+        
+        return {
+            "fields": field_names,
+            "key_field": key_field,
+            "has_passage_index": "passage_index" in field_names
+        }
+        
     def verify_index_exists(self):
         try:
-            # Get the specific index to verify it exists and check its schema
-            index = self.index_client.get_index(self.index_name)
-            print(f"✅ Successfully connected to existing index: {self.index_name}")
-            
-            # Check index schema for field compatibility
-            print(f"📋 Index has {len(index.fields)} fields:")
-            field_names = []
-            key_field = None
-            
-            for field in index.fields:
-                field_names.append(field.name)
-                if field.key:
-                    key_field = field.name
-                print(f"  - {field.name} ({field.type}) {'[KEY]' if field.key else ''} {'[SEARCHABLE]' if getattr(field, 'searchable', False) else ''}")
-            
-            # Check if required fields exist
-            required_fields = ['id', 'video_id', 'title', 'content']
-            missing_fields = [field for field in required_fields if field not in field_names]
-            
-            if missing_fields:
-                print(f"Warning: Missing expected fields: {missing_fields}")
-                print(f"Available fields: {field_names}")
-                print("You may need to adjust your document structure")
-            
-            if key_field:
-                print(f"🔑 Key field: {key_field}")
-            else:
-                print("⚠️ Warning: No key field found")
-            
+            self.get_schema()
             return True
             
         except Exception as e:
@@ -71,8 +166,52 @@ class SearchService:
             print("4. The service URL is correct")
             return False
 
-    def index_transcript(self, video_id, title, transcript):
-        """Index a transcript into the existing Azure Search index"""
+    def get_indexed_passage_keys(self, video_id):
+        """Keys of the passages currently indexed for a video"""
+        results = self.search_client.search(
+            search_text="*",
+            filter=f"parent_id eq '{escape_filter_value(video_id)}'",
+            select="chunk_id"
+        )
+        return {doc["chunk_id"] for doc in results}
+
+    def index_in_batches(self, uploads, delete_keys=(), merges=()):
+        """Send uploads, merges and deletes together, in batches within the per-request count and size limits"""
+        actions = [("upload", document) for document in uploads]
+        actions.extend(("merge", document) for document in merges)
+        actions.extend(("delete", {"chunk_id": key}) for key in delete_keys)
+        
+        failed = []
+        for batch in iter_batches(actions, Config.SEARCH_BATCH_MAX_DOCUMENTS, Config.SEARCH_BATCH_MAX_BYTES, size_of=lambda action: action[1]):
+            index_batch = IndexDocumentsBatch()
+            index_batch.add_upload_actions([document for action, document in batch if action == "upload"])
+            index_batch.add_merge_actions([document for action, document in batch if action == "merge"])
+            index_batch.add_delete_actions([document for action, document in batch if action == "delete"])
+            
+            try:
+                results = self.search_client.index_documents(index_batch)
+            except HttpResponseError as e:
+                # A rejected field usually means the index changed under us
+                if e.status_code == 400:
+                    self.invalidate_schema()
+                raise
+            
+            failed.extend(result for result in results if not result.succeeded)
+        return failed
+
+    def index_transcript(self, video_id, title, transcript, indexed_keys=None):
+        """Index a transcript into the existing Azure Search index as overlapping passages.
+
+        indexed_keys are the passage keys recorded when the video was last
+        indexed, in passage order. With them the diff is worked out locally
+        and the index call is a single request; without them the index is
+        queried for the keys first. The result carries the new keys for the
+        caller to record.
+
+        Keys depend on content only, so an inserted or removed passage leaves
+        the others untouched; when the index has a passage_index field,
+        passages that merely moved get a merge of their new position.
+        """
         try:
             if not self.verify_index_exists():
                 return {
@@ -87,78 +226,85 @@ class SearchService:
                     "message": "Missing required fields: video_id, title, or transcript"
                 }
     
-            # Map to the existing index schema
-            document = {
-                "chunk_id": str(video_id),  
-                "parent_id": str(video_id),
-                "content": str(transcript),
-                "title": str(title)[:1000],
-                "url": f"https://www.youtube.com/watch?v={video_id}", # YouTube URL
-                "filepath": f"youtube/{video_id}.txt",
-            }
-             
-            print(f" Preparing to index transcript:")
-            print(f"   - Video ID: {video_id}")
-            print(f"   - Title: {title[:50]}...")
-            print(f"   - Content length: {len(transcript)} characters")
-            print(f"   - Mapped to existing schema with chunk_id as key")
+            include_index = self.get_schema()["has_passage_index"]
+            documents = build_passage_documents(video_id, title, transcript, include_index)
             
-            # Upload to Azure Search with detailed error handling
-            print("🔄 Uploading document to Azure Search...")
-            result = self.search_client.upload_documents(documents=[document])
+            # Previous position of each key, when known
+            previous_index = {}
+            if indexed_keys is not None:
+                existing_keys = set(indexed_keys)
+                previous_index = {key: index for index, key in enumerate(indexed_keys)}
+            else:
+                try:
+                    existing_keys = self.get_indexed_passage_keys(video_id)
+                except Exception as e:
+                    print(f"⚠️ Could not list indexed passages for {video_id}, re-uploading all: {str(e)}")
+                    existing_keys = set()
             
-            print(f" Upload result: {len(result)} results returned")
+            # Keys change with passage content, so unchanged passages are skipped
+            new_keys = {document["chunk_id"] for document in documents}
+            to_upload = [document for document in documents if document["chunk_id"] not in existing_keys]
+            stale_keys = existing_keys - new_keys
+            moved = []
+            if include_index:
+                moved = [
+                    {"chunk_id": document["chunk_id"], "passage_index": document["passage_index"]}
+                    for document in documents
+                    if document["chunk_id"] in existing_keys and previous_index.get(document["chunk_id"]) != document["passage_index"]
+                ]
+             
+            print(f" Indexing transcript for {video_id} ({title[:50]}...):")
+            print(f"   - {len(documents)} passages, {len(to_upload)} new or changed, {len(moved)} moved, {len(stale_keys)} stale")
             
-            if not result:
-                return {
-                    "success": False,
-                    "message": "No upload results returned from Azure Search"
-                }
-           
-            upload_result = result[0]
-            print(f" First result details:")
-            print(f"   - Succeeded: {upload_result.succeeded}")
-            print(f"   - Key: {getattr(upload_result, 'key', 'N/A')}")
-            print(f"   - Status code: {getattr(upload_result, 'status_code', 'N/A')}")
+            # New passages, position updates and deletions of stale ones travel in the same request
+            failed = self.index_in_batches(to_upload, stale_keys, moved)
             
-            if upload_result.succeeded:
-                print(f"✅ Successfully indexed transcript for video: {title}")
-                return {
-                    "success": True,
-                    "message": "Transcript indexed successfully"
-                }
-            else:
-                #error information
-                error_details = []
-                if hasattr(upload_result, 'error_message') and upload_result.error_message:
-                    error_details.append(f"Error message: {upload_result.error_message}")
-                if hasattr(upload_result, 'status_code'):
-                    error_details.append(f"Status code: {upload_result.status_code}")
-                if hasattr(upload_result, 'key'):
-                    error_details.append(f"Document key: {upload_result.key}")
-                
-                error_msg = "Document upload failed. " + " | ".join(error_details) if error_details else "Unknown upload error"
+            if failed:
+                error_details = [
+                    f"{getattr(result, 'key', 'N/A')}: {getattr(result, 'error_message', None) or getattr(result, 'status_code', 'unknown error')}"
+                    for result in failed[:5]
+                ]
+                error_msg = f"{len(failed)} of {len(to_upload) + len(moved) + len(stale_keys)} index actions failed. " + " | ".join(error_details)
                 print(f"❌ {error_msg}")
                 
                 return {
                     "success": False,
                     "message": error_msg
                 }
+            
+            print(f"✅ Successfully indexed transcript for video: {title}")
+            return {
+                "success": True,
+                "message": "Transcript indexed successfully",
+                "passages": len(documents),
+                "uploaded": len(to_upload),
+                "moved": len(moved),
+                "deleted": len(stale_keys),
+                "keys": [document["chunk_id"] for document in documents]
+            }
                 
         except Exception as e:
             error_msg = f"Exception during indexing: {type(e).__name__}: {str(e)}"
             print(f"❌ {error_msg}")
+            return {
+                "success": False,
+                "message": error_msg
+            }
             
     def search_transcript(self, query, top=3):
         """Search for transcripts in Azure Search using existing schema"""
         try:
+            select = "chunk_id,parent_id,title,url"
+            if self.get_schema()["has_passage_index"]:
+                select += ",passage_index"
+            
             results = self.search_client.search(
                 search_text=query,
                 top=top,
                 highlight_fields="content",
                 highlight_pre_tag="<strong>",
                 highlight_post_tag="</strong>",
-                select="chunk_id,parent_id,title,url"
+                select=select
             )
             
             result_list = []
@@ -166,6 +312,7 @@ class SearchService:
                 result_item = {
                     "id": doc["chunk_id"],  
                     "video_id": doc["parent_id"],  
+                    "passage_index": doc.get("passage_index"),
                     "title": doc["title"],
                     "url": doc.get("url", ""),
                     "score": doc.get("@search.score", 0.0)
@@ -185,3 +332,21 @@ class SearchService:
                 "success": False,
                 "error": str(e)
             }
+
+_search_service = None
+_search_service_lock = threading.Lock()
+
+def get_search_service():
+    """Process-wide search backend (Azure AI Search or the local index), created on first use"""
+    global _search_service
+    
+    if _search_service is None:
+        with _search_service_lock:
+            if _search_service is None:
+                if Config.SEARCH_BACKEND == 'local':
+                    from azure_tennis_api.services.local_search_service import LocalSearchService
+                    _search_service = LocalSearchService()
+                else:
+                    _search_service = SearchService()
+    
+    return _search_service
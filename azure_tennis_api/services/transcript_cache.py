@@ -0,0 +1,216 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from azure_tennis_api.config import Config
+from azure_tennis_api.services.blob_storage_service import get_blob_name
+
+class TranscriptCache:
+    """Read-through, write-through cache in front of BlobStorageService.
+
+    Transcripts are kept in a size-bounded in-memory LRU and in a
+    size-bounded directory on disk, keyed by blob name and stored with the
+    blob's ETag. A read younger than TRANSCRIPT_CACHE_FRESH_SECONDS is served
+    as is; older ones are revalidated with a conditional (If-None-Match)
+    download, which costs a 304 and no body when the blob is unchanged.
+    If that download fails, the cached copy is served until storage answers
+    again; an entry is only dropped once the blob is known to be gone.
+    """
+
+    def __init__(self, blob_service, cache_dir=None, memory_bytes=None, disk_bytes=None):
+        self.blob_service = blob_service
+        self.cache_dir = cache_dir or Config.TRANSCRIPT_CACHE_DIR
+        self.memory_bytes = memory_bytes if memory_bytes is not None else Config.TRANSCRIPT_CACHE_MEMORY_BYTES
+        self.disk_bytes = disk_bytes if disk_bytes is not None else Config.TRANSCRIPT_CACHE_DISK_BYTES
+        self.lock = threading.Lock()
+
+        # blob name -> {"content", "etag", "size", "validated_at"}
+        self.memory = OrderedDict()
+        self.memory_used = 0
+        self.counters = dict.fromkeys(
+            ["memory_hits", "disk_hits", "revalidated", "misses", "writes", "evictions", "errors"], 0
+        )
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.disk_used = sum(entry.stat().st_size for entry in os.scandir(self.cache_dir) if entry.is_file())
+
+    def _paths(self, blob_name):
+        base = os.path.join(self.cache_dir, blob_name)
+        return base, base + ".meta"
+
+    def _count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def _remember(self, blob_name, content, etag, validated_at):
+        size = len(content.encode('utf-8'))
+        with self.lock:
+            previous = self.memory.pop(blob_name, None)
+            if previous:
+                self.memory_used -= previous["size"]
+            if size > self.memory_bytes:
+                return
+            self.memory[blob_name] = {"content": content, "etag": etag, "size": size, "validated_at": validated_at}
+            self.memory_used += size
+            while self.memory_used > self.memory_bytes:
+                _, evicted = self.memory.popitem(last=False)
+                self.memory_used -= evicted["size"]
+                self.counters["evictions"] += 1
+
+    def _read_disk(self, blob_name):
+        content_path, meta_path = self._paths(blob_name)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            with open(content_path, 'r', encoding='utf-8') as f:
+                content = f.read()
+            os.utime(content_path)  # recency for eviction
+            return content, meta
+        except (OSError, ValueError):
+            return None, None
+
+    def _write_disk(self, blob_name, content, etag, validated_at):
+        content_path, meta_path = self._paths(blob_name)
+        data = content.encode('utf-8')
+        meta = json.dumps({"etag": etag, "validated_at": validated_at}).encode('utf-8')
+
+        try:
+            previous = sum(os.path.getsize(path) for path in (content_path, meta_path) if os.path.exists(path))
+            for path, payload in ((content_path, data), (meta_path, meta)):
+                temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(temp_path, 'wb') as f:
+                    f.write(payload)
+                os.replace(temp_path, path)
+        except OSError as e:
+            print(f"Warning: Failed to write transcript cache entry {blob_name}: {e}")
+            self._count("errors")
+            return
+
+        with self.lock:
+            self.disk_used += len(data) + len(meta) - previous
+            over = self.disk_used > self.disk_bytes
+        if over:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        """Drop least recently used entries until the directory is back under 90% of its limit"""
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and not entry.name.endswith((".meta", ".tmp")):
+                entries.append((entry.stat().st_mtime, entry.name))
+        entries.sort()
+
+        target = self.disk_bytes * 0.9
+        with self.lock:
+            used = self.disk_used
+        for _, name in entries:
+            if used <= target:
+                break
+            for path in self._paths(name):
+                try:
+                    used -= os.path.getsize(path)
+                    os.remove(path)
+                except OSError:
+                    pass
+            self._count("evictions")
+
+        with self.lock:
+            self.disk_used = used
+
+    def _forget(self, blob_name):
+        with self.lock:
+            entry = self.memory.pop(blob_name, None)
+            if entry:
+                self.memory_used -= entry["size"]
+        for path in self._paths(blob_name):
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+                with self.lock:
+                    self.disk_used -= size
+            except OSError:
+                pass
+
+    def get(self, video_id, is_clean=False):
+        """Transcript text, from memory, disk or blob storage; same result shape as download_transcript"""
+        blob_name = get_blob_name(video_id, is_clean)
+        now = time.time()
+
+        with self.lock:
+            entry = self.memory.get(blob_name)
+            if entry:
+                self.memory.move_to_end(blob_name)
+        source = "memory_hits"
+
+        if entry is None:
+            content, meta = self._read_disk(blob_name)
+            if content is not None:
+                entry = {"content": content, "etag": meta.get("etag"), "validated_at": meta.get("validated_at", 0)}
+                source = "disk_hits"
+
+        if entry and now - entry["validated_at"] < Config.TRANSCRIPT_CACHE_FRESH_SECONDS:
+            self._count(source)
+            if source == "disk_hits":
+                self._remember(blob_name, entry["content"], entry["etag"], entry["validated_at"])
+            return {"success": True, "content": entry["content"], "etag": entry["etag"], "cache": source}
+
+        result = self.blob_service.download_transcript(video_id, is_clean=is_clean, etag=entry["etag"] if entry else None)
+
+        if result.get("not_modified"):
+            self._count("revalidated")
+            self._remember(blob_name, entry["content"], entry["etag"], now)
+            self._write_disk(blob_name, entry["content"], entry["etag"], now)
+            return {"success": True, "content": entry["content"], "etag": entry["etag"], "cache": "revalidated"}
+
+        if not result.get("success", False):
+            self._count("errors")
+            if entry and not result.get("not_found"):
+                # Storage unreachable: the cached copy is the best we have until it can be revalidated
+                print(f"Warning: Serving unvalidated cached {blob_name}: {result.get('message')}")
+                return {"success": True, "content": entry["content"], "etag": entry["etag"], "cache": "stale"}
+            if entry:
+                # The blob is really gone, so the transcript was deleted
+                self._forget(blob_name)
+            return result
+
+        self._count("misses")
+        self._remember(blob_name, result["content"], result.get("etag"), now)
+        self._write_disk(blob_name, result["content"], result.get("etag"), now)
+        return dict(result, cache="miss")
+
+    def put(self, video_id, content, is_clean=False, cache=True):
+        """Upload through to blob storage and cache the new version under its ETag.
+
+        Pass cache=False when the caller keeps its own copy (the captions
+        dir); any older cached version is dropped instead, and the blob is
+        cached on its next read.
+        """
+        blob_name = get_blob_name(video_id, is_clean)
+        result = self.blob_service.upload_transcript(video_id=video_id, content=content, is_clean=is_clean)
+
+        if result.get("success", False) and cache:
+            now = time.time()
+            self._count("writes")
+            self._remember(blob_name, content, result.get("etag"), now)
+            self._write_disk(blob_name, content, result.get("etag"), now)
+        else:
+            self._forget(blob_name)
+
+        return result
+
+    def invalidate(self, video_id):
+        for is_clean in (False, True):
+            self._forget(get_blob_name(video_id, is_clean))
+
+    def stats(self):
+        with self.lock:
+            lookups = self.counters["memory_hits"] + self.counters["disk_hits"] + self.counters["revalidated"] + self.counters["misses"]
+            hits = lookups - self.counters["misses"]
+            return dict(
+                self.counters,
+                hit_rate=round(hits / lookups, 4) if lookups else None,
+                memory_entries=len(self.memory),
+                memory_bytes=self.memory_used,
+                disk_bytes=self.disk_used
+            )
@@ -0,0 +1,160 @@
+import math
+import re
+from azure_tennis_api.config import Config
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Sentence ends inside a caption line or paragraph
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+(?=["\'(]?[A-Z0-9])')
+
+# Tokens kept free for the chat message wrapper and the "part i of n" header
+PROMPT_OVERHEAD_TOKENS = 64
+OUTPUT_MARGIN_TOKENS = 200
+
+_encoding = None
+
+def get_encoding():
+    """Tokenizer matching the configured deployment, or None without tiktoken"""
+    global _encoding
+
+    if _encoding is None and tiktoken is not None:
+        # Azure deployment names use "gpt-35" where OpenAI model names use "gpt-3.5"
+        model_name = Config.AZURE_OPENAI_DEPLOYMENT.replace('gpt-35', 'gpt-3.5')
+        try:
+            _encoding = tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            _encoding = tiktoken.get_encoding('cl100k_base')
+
+    return _encoding
+
+def count_tokens(text):
+    """Count tokens locally, falling back to ~4 characters per token"""
+    encoding = get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+def get_input_budget(system_prompt):
+    """Largest chunk (in tokens) whose prompt and expected output fit the model"""
+    ratio = Config.CLEANING_OUTPUT_RATIO
+    available = Config.AZURE_OPENAI_CONTEXT_TOKENS - count_tokens(system_prompt) - PROMPT_OVERHEAD_TOKENS - OUTPUT_MARGIN_TOKENS
+
+    by_context = available / (1 + ratio)
+    by_output = (Config.AZURE_OPENAI_MAX_OUTPUT_TOKENS - OUTPUT_MARGIN_TOKENS) / ratio
+
+    return max(1, int(min(by_context, by_output)))
+
+def get_max_tokens(input_tokens):
+    """max_tokens for a cleaning call, sized from the expected output length"""
+    expected = math.ceil(input_tokens * Config.CLEANING_OUTPUT_RATIO) + OUTPUT_MARGIN_TOKENS
+    return min(expected, Config.AZURE_OPENAI_MAX_OUTPUT_TOKENS)
+
+def split_units(text):
+    """Split a transcript into caption lines, and long lines into sentences"""
+    units = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line:
+            units.extend(part for part in SENTENCE_BOUNDARY.split(line) if part)
+    return units
+
+def split_oversized_unit(unit, max_tokens):
+    """Fall back to word boundaries for a single sentence larger than a chunk"""
+    pieces = []
+    current = []
+    current_tokens = 0
+
+    for word in unit.split():
+        word_tokens = count_tokens(word + ' ')
+        if current and current_tokens + word_tokens > max_tokens:
+            pieces.append(' '.join(current))
+            current = []
+            current_tokens = 0
+        current.append(word)
+        current_tokens += word_tokens
+
+    if current:
+        pieces.append(' '.join(current))
+
+    return pieces
+
+def chunk_transcript(text, max_tokens):
+    """Pack caption lines and sentences into (text, tokens) chunks of at most max_tokens.
+
+    The number of chunks is the minimum the budget allows, and the
+    transcript is spread evenly across them so the last chunk is not a
+    small remainder.
+    """
+    units = []
+    for unit in split_units(text):
+        # +1 for the newline that joins units back together
+        unit_tokens = count_tokens(unit) + 1
+        if unit_tokens > max_tokens:
+            units.extend((piece, count_tokens(piece) + 1) for piece in split_oversized_unit(unit, max_tokens - 1))
+        else:
+            units.append((unit, unit_tokens))
+
+    if not units:
+        return []
+
+    total_tokens = sum(tokens for _, tokens in units)
+    chunk_count = math.ceil(total_tokens / max_tokens)
+    target = total_tokens / chunk_count
+
+    chunks = []
+    current = []
+    current_tokens = 0
+
+    for unit, unit_tokens in units:
+        over_target = current_tokens + unit_tokens / 2 > target and len(chunks) < chunk_count - 1
+        if current and (over_target or current_tokens + unit_tokens > max_tokens):
+            chunks.append(('\n'.join(current), current_tokens))
+            current = []
+            current_tokens = 0
+        current.append(unit)
+        current_tokens += unit_tokens
+
+    if current:
+        chunks.append(('\n'.join(current), current_tokens))
+
+    return chunks
+
+def split_passages(text, passage_tokens, overlap_tokens=0):
+    """Split a transcript into overlapping passages for retrieval.
+
+    Passages follow caption line and sentence boundaries; each one starts
+    with the last overlap_tokens worth of units of the previous passage so
+    an answer straddling a boundary is still found in one piece.
+    """
+    units = [(unit, count_tokens(unit) + 1) for unit in split_units(text)]
+    passages = []
+    start = 0
+
+    while start < len(units):
+        end = start
+        tokens = 0
+        while end < len(units) and (end == start or tokens + units[end][1] <= passage_tokens):
+            tokens += units[end][1]
+            end += 1
+
+        passages.append({
+            'index': len(passages),
+            'content': '\n'.join(unit for unit, _ in units[start:end]),
+            'tokens': tokens
+        })
+
+        if end >= len(units):
+            break
+
+        # Step back over the tail of this passage to form the overlap
+        next_start = end
+        overlap = 0
+        while next_start - 1 > start and overlap + units[next_start - 1][1] <= overlap_tokens:
+            next_start -= 1
+            overlap += units[next_start][1]
+        start = next_start
+
+    return passages
@@ -0,0 +1,267 @@
+import os
+import threading
+from collections import OrderedDict
+from azure_tennis_api.config import Config
+from azure_tennis_api.services.blob_storage_service import get_blob_name
+
+STREAM_CHUNK_CHARS = 64 * 1024
+
+class TranscriptStore:
+    """Single read/write path for transcripts.
+
+    Reads go memory -> captions dir -> blob storage. The local file wins
+    when both exist: it is written alongside the blob and costs a stat
+    instead of a request. Memory entries hold local files only and are
+    checked against the file's (mtime_ns, size) on every hit, so a write
+    from the worker process shows up on the next read. Blob reads go through
+    TranscriptCache, which keeps its own memory and disk tiers.
+    """
+
+    def __init__(self, transcript_cache, captions_dir=None, memory_chars=None):
+        self.transcript_cache = transcript_cache
+        self.captions_dir = captions_dir or Config.CAPTIONS_DIR
+        self.memory_chars = memory_chars if memory_chars is not None else Config.TRANSCRIPT_STORE_MEMORY_CHARS
+        self.lock = threading.Lock()
+
+        # (video_id, is_clean) -> {"content", "version", "size"}
+        self.memory = OrderedDict()
+        self.memory_used = 0
+        self.counters = dict.fromkeys(["memory_hits", "local_reads", "blob_reads", "not_found"], 0)
+
+    def path(self, video_id, is_clean=False):
+        return os.path.join(self.captions_dir, get_blob_name(video_id, is_clean))
+
+    def _count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def _remember(self, key, content, version):
+        size = len(content)
+        with self.lock:
+            previous = self.memory.pop(key, None)
+            if previous:
+                self.memory_used -= previous["size"]
+            if size > self.memory_chars:
+                return
+            self.memory[key] = {"content": content, "version": version, "size": size}
+            self.memory_used += size
+            while self.memory_used > self.memory_chars:
+                _, evicted = self.memory.popitem(last=False)
+                self.memory_used -= evicted["size"]
+
+    def _forget(self, key):
+        with self.lock:
+            entry = self.memory.pop(key, None)
+            if entry:
+                self.memory_used -= entry["size"]
+
+    def _local_stat(self, video_id, is_clean):
+        try:
+            stat = os.stat(self.path(video_id, is_clean))
+        except OSError:
+            return None
+        return {"source": "local_file", "size": stat.st_size, "version": (stat.st_mtime_ns, stat.st_size)}
+
+    def _blob_stat(self, video_id, is_clean):
+        result = self.transcript_cache.blob_service.get_transcript_properties(video_id, is_clean=is_clean)
+        if not result.get("success", False):
+            return None
+        return {"source": "blob_storage", "size": result["size"], "version": result["etag"]}
+
+    def _map_blob(self, function, video_ids, is_clean):
+        """Run a per-video blob call for several videos on the blob service's bounded pool"""
+        if len(video_ids) <= 1:
+            return {video_id: function(video_id, is_clean) for video_id in video_ids}
+        return self.transcript_cache.blob_service.map_videos(function, video_ids, is_clean)
+
+    def stat_many(self, video_ids, is_clean=False):
+        """{video_id: {"source", "size", "version"} or None}; blob lookups only for videos missing locally"""
+        stats = {video_id: self._local_stat(video_id, is_clean) for video_id in dict.fromkeys(video_ids)}
+        if Config.USE_BLOB_STORAGE:
+            missing = [video_id for video_id, stat in stats.items() if stat is None]
+            stats.update(self._map_blob(self._blob_stat, missing, is_clean))
+        return stats
+
+    def stat(self, video_id, is_clean=False):
+        return self.stat_many([video_id], is_clean)[video_id]
+
+    def exists_many(self, video_ids, is_clean=False):
+        return {video_id for video_id, stat in self.stat_many(video_ids, is_clean).items() if stat}
+
+    def exists(self, video_id, is_clean=False):
+        return self.stat(video_id, is_clean) is not None
+
+    def local_availability(self, video_ids):
+        """{video_id: {"has_raw_local", "has_clean_local"}} from a stat per file, no blob calls"""
+        return {
+            video_id: {
+                "has_raw_local": self._local_stat(video_id, False) is not None,
+                "has_clean_local": self._local_stat(video_id, True) is not None
+            }
+            for video_id in video_ids
+        }
+
+    def _get_local(self, video_id, is_clean):
+        """Local result, or None when the file doesn't exist"""
+        key = (video_id, is_clean)
+        local = self._local_stat(video_id, is_clean)
+        if local is None:
+            self._forget(key)
+            return None
+
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry and entry["version"] == local["version"]:
+                self.memory.move_to_end(key)
+                self.counters["memory_hits"] += 1
+                return {"success": True, "content": entry["content"], "version": entry["version"], "source": "memory"}
+
+        try:
+            with open(self.path(video_id, is_clean), "r", encoding="utf-8") as f:
+                content = f.read()
+        except OSError:
+            return None
+
+        self._count("local_reads")
+        self._remember(key, content, local["version"])
+        return {"success": True, "content": content, "version": local["version"], "source": "local_file"}
+
+    def _get_blob(self, video_id, is_clean):
+        result = self.transcript_cache.get(video_id, is_clean=is_clean)
+        if not result.get("success", False):
+            return result
+        self._count("blob_reads")
+        return {"success": True, "content": result["content"], "version": result.get("etag"), "source": "blob_storage"}
+
+    def _not_found(self, video_id, is_clean, result=None):
+        self._count("not_found")
+        kind = "Clean transcript" if is_clean else "Transcript"
+        message = f"{kind} not found for video ID: {video_id}"
+        if result and result.get("message"):
+            message = f"{message} ({result['message']})"
+        return {"success": False, "not_found": True, "message": message}
+
+    def get_many(self, video_ids, is_clean=False):
+        """{video_id: result} with blob fallbacks fetched concurrently"""
+        results = {video_id: self._get_local(video_id, is_clean) for video_id in dict.fromkeys(video_ids)}
+
+        missing = [video_id for video_id, result in results.items() if result is None]
+        if Config.USE_BLOB_STORAGE:
+            results.update(self._map_blob(self._get_blob, missing, is_clean))
+
+        return {
+            video_id: result if result and result.get("success", False) else self._not_found(video_id, is_clean, result)
+            for video_id, result in results.items()
+        }
+
+    def get(self, video_id, is_clean=False):
+        """{"success", "content", "version", "source"}, or success False with a message"""
+        return self.get_many([video_id], is_clean)[video_id]
+
+    def stream(self, video_id, is_clean=False, chunk_chars=STREAM_CHUNK_CHARS):
+        """Iterator over the transcript text in chunks, or None when there is no transcript.
+
+        Local files not already in memory are read incrementally and not
+        cached, so large transcripts can be sent without holding them whole.
+        Blob transcripts are decompressed in one piece and then chunked.
+        """
+        key = (video_id, is_clean)
+        local = self._local_stat(video_id, is_clean)
+
+        if local is not None:
+            with self.lock:
+                entry = self.memory.get(key)
+                content = entry["content"] if entry and entry["version"] == local["version"] else None
+            if content is not None:
+                self._count("memory_hits")
+                return iter_text(content, chunk_chars)
+            try:
+                f = open(self.path(video_id, is_clean), "r", encoding="utf-8")
+            except OSError:
+                f = None
+            if f is not None:
+                self._count("local_reads")
+                return iter_file(f, chunk_chars)
+
+        result = self.get(video_id, is_clean)
+        if not result["success"]:
+            return None
+        return iter_text(result["content"], chunk_chars)
+
+    def put(self, video_id, content, is_clean=False):
+        """Write the local file, then the blob when blob storage is enabled"""
+        path = self.path(video_id, is_clean)
+        os.makedirs(self.captions_dir, exist_ok=True)
+
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(temp_path, path)
+
+        local = self._local_stat(video_id, is_clean)
+        if local:
+            self._remember((video_id, is_clean), content, local["version"])
+
+        result = {"success": True, "path": path}
+        if Config.USE_BLOB_STORAGE:
+            # The local file is always read first, so a second copy in the blob cache would never be used
+            blob_result = self.transcript_cache.put(video_id, content, is_clean=is_clean, cache=False)
+            if not blob_result["success"]:
+                print(f"Warning: Failed to upload {get_blob_name(video_id, is_clean)} to blob storage: {blob_result.get('message')}")
+            result["blob"] = blob_result
+
+        return result
+
+    def delete_many(self, video_ids):
+        """Remove both transcripts of each video from every tier.
+
+        Blobs go in concurrent batch requests. Returns the local paths that
+        were deleted and the blob names that could not be.
+        """
+        video_ids = list(dict.fromkeys(video_ids))
+        deleted = []
+        for video_id in video_ids:
+            for is_clean in (False, True):
+                self._forget((video_id, is_clean))
+                path = self.path(video_id, is_clean)
+                try:
+                    os.remove(path)
+                    deleted.append(path)
+                except FileNotFoundError:
+                    pass
+                except OSError as e:
+                    print(f"Warning: Failed to delete file {path}: {e}")
+            self.transcript_cache.invalidate(video_id)
+
+        failed_blobs = []
+        if Config.USE_BLOB_STORAGE and video_ids:
+            blob_result = self.transcript_cache.blob_service.delete_many(video_ids)
+            failed_blobs = blob_result["failed"]
+            if failed_blobs:
+                print(f"Warning: Failed to delete {len(failed_blobs)} blobs: {', '.join(failed_blobs[:10])}")
+
+        return {"deleted_files": deleted, "failed_blobs": failed_blobs}
+
+    def delete(self, video_id):
+        return self.delete_many([video_id])
+
+    def stats(self):
+        with self.lock:
+            return dict(
+                self.counters,
+                memory_entries=len(self.memory),
+                memory_chars=self.memory_used,
+                blob_cache=self.transcript_cache.stats()
+            )
+
+def iter_text(content, chunk_chars):
+    for start in range(0, len(content), chunk_chars):
+        yield content[start:start + chunk_chars]
+
+def iter_file(f, chunk_chars):
+    with f:
+        while True:
+            chunk = f.read(chunk_chars)
+            if not chunk:
+                return
+            yield chunk
@@ -1,7 +1,44 @@
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from datetime import datetime, timedelta
 import requests
+from requests.adapters import HTTPAdapter
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from urllib3.util.retry import Retry
 from youtube_transcript_api import YouTubeTranscriptApi
 from azure_tennis_api.config import Config
+from azure_tennis_api.models import db, VideoMetadata
+
+# The YouTube Data API accepts at most 50 ids per videos.list call
+VIDEOS_LIST_MAX_IDS = 50
+
+DURATION_PATTERN = re.compile(r'P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?')
+
+def create_session():
+    """Keep-alive session that retries throttling and server errors with backoff"""
+    session = requests.Session()
+    retry = Retry(
+        total=Config.YOUTUBE_MAX_RETRIES,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET"],
+        respect_retry_after_header=True
+    )
+    adapter = HTTPAdapter(max_retries=retry, pool_maxsize=Config.YOUTUBE_HTTP_POOL_SIZE)
+    session.mount("https://", adapter)
+    return session
+
+session = create_session()
+transcript_executor = ThreadPoolExecutor(max_workers=Config.TRANSCRIPT_FETCH_CONCURRENCY, thread_name_prefix="transcript-fetch")
+
+# Fetches that timed out but are still running; each one holds a pool slot until it returns
+stalled_fetches = set()
+stalled_fetches_lock = threading.Lock()
+
+def release_stalled_fetch(future):
+    with stalled_fetches_lock:
+        stalled_fetches.discard(future)
 
 def extract_video_id(input_text):
     """Extract video or playlist ID from YouTube URL or direct ID input"""
@@ -28,7 +65,7 @@ def extract_video_id(input_text):
         return {'type': 'video', 'id': input_text}
 
 def get_video_ids_from_playlist(playlist_id, max_videos=None):
-    """Get video IDs from a YouTube playlist with a limit"""
+    """Get video IDs from a YouTube playlist, following nextPageToken up to the limit"""
     if max_videos is None:
         max_videos = Config.MAX_PLAYLIST_VIDEOS
         
@@ -42,53 +79,179 @@ def get_video_ids_from_playlist(playlist_id, max_videos=None):
     }
     
     try:
-        response = requests.get(base_url, params=params)
-        if response.status_code != 200:
-            raise Exception(f"API error {response.status_code}: {response.text}")
-        
-        data = response.json()
-        
-        for item in data.get('items', [])[:max_videos]:
-            video_ids.append(item['contentDetails']['videoId'])
+        while len(video_ids) < max_videos:
+            response = session.get(base_url, params=params, timeout=Config.YOUTUBE_REQUEST_TIMEOUT_SECONDS)
+            if response.status_code != 200:
+                raise Exception(f"API error {response.status_code}: {response.text}")
+            
+            data = response.json()
+            
+            for item in data.get('items', []):
+                video_ids.append(item['contentDetails']['videoId'])
+            
+            if not data.get('nextPageToken'):
+                break
+            params["pageToken"] = data['nextPageToken']
             
-        return video_ids
+        return video_ids[:max_videos]
     except Exception as e:
-        print(f"Error getting playlist videos: {str(e)}")
-        return []
+        # Keep whatever pages were read before the failure
+        print(f"Error getting playlist videos after {len(video_ids)} ids: {str(e)}")
+        return video_ids[:max_videos]
 
-def get_video_title(video_id):
-    """Gets the title of a YouTube video using its ID"""
+def parse_duration(duration):
+    """Seconds in an ISO 8601 duration such as PT1H2M3S"""
+    match = DURATION_PATTERN.fullmatch(duration or '')
+    if not match or not any(match.groups()):
+        return None
+    days, hours, minutes, seconds = (int(value or 0) for value in match.groups())
+    return ((days * 24 + hours) * 60 + minutes) * 60 + seconds
+
+def parse_published_at(published_at):
+    try:
+        return datetime.strptime(published_at, "%Y-%m-%dT%H:%M:%SZ")
+    except (TypeError, ValueError):
+        return None
+
+def fetch_video_metadata(video_ids):
+    """Metadata straight from the API, 50 ids per videos.list request.
+
+    Ids YouTube doesn't return are recorded as not found; ids in a batch
+    that failed outright are left out so they are retried next time.
+    """
     base_url = "https://www.googleapis.com/youtube/v3/videos"
-    params = {
-        "part": "snippet",
-        "id": video_id,
-        "key": Config.YOUTUBE_API_KEY
-    }
+    metadata = {}
     
-    try:
-        response = requests.get(base_url, params=params)
-        if response.status_code != 200:
-            return f"Unknown Title ({video_id})"
+    for start in range(0, len(video_ids), VIDEOS_LIST_MAX_IDS):
+        batch = video_ids[start:start + VIDEOS_LIST_MAX_IDS]
+        params = {
+            "part": "snippet,contentDetails",
+            "id": ",".join(batch),
+            "maxResults": VIDEOS_LIST_MAX_IDS,
+            "key": Config.YOUTUBE_API_KEY
+        }
+        
+        try:
+            response = session.get(base_url, params=params, timeout=Config.YOUTUBE_REQUEST_TIMEOUT_SECONDS)
+            if response.status_code != 200:
+                print(f"Error getting video metadata: API error {response.status_code}: {response.text}")
+                continue
+            items = response.json().get('items', [])
+        except Exception as e:
+            print(f"Error getting video metadata: {str(e)}")
+            continue
         
-        data = response.json()
-        if data.get('items'):
-            return data['items'][0]['snippet']['title']
-        else:
-            return f"Unknown Title ({video_id})"
+        now = datetime.utcnow()
+        for video_id in batch:
+            metadata[video_id] = {"video_id": video_id, "found": False, "fetched_at": now}
+        for item in items:
+            snippet = item.get('snippet', {})
+            metadata[item['id']] = {
+                "video_id": item['id'],
+                "title": snippet.get('title', '')[:500],
+                "duration_seconds": parse_duration(item.get('contentDetails', {}).get('duration')),
+                "channel_title": (snippet.get('channelTitle') or '')[:200] or None,
+                "published_at": parse_published_at(snippet.get('publishedAt')),
+                "found": True,
+                "fetched_at": now
+            }
+    
+    return metadata
+
+def store_video_metadata(metadata):
+    rows = [
+        {
+            "video_id": entry["video_id"],
+            "title": entry.get("title"),
+            "duration_seconds": entry.get("duration_seconds"),
+            "channel_title": entry.get("channel_title"),
+            "published_at": entry.get("published_at"),
+            "found": entry["found"],
+            "fetched_at": entry["fetched_at"]
+        }
+        for entry in metadata.values()
+    ]
+    if not rows:
+        return
+    
+    statement = pg_insert(VideoMetadata).values(rows)
+    db.session.execute(statement.on_conflict_do_update(
+        index_elements=['video_id'],
+        set_={column: statement.excluded[column] for column in rows[0] if column != 'video_id'}
+    ))
+    db.session.commit()
+
+def get_video_metadata(video_ids):
+    """Metadata for many videos: cached rows from one IN query, the stale or missing fetched in batches"""
+    video_ids = list(dict.fromkeys(video_ids))
+    metadata = {}
+    
+    try:
+        cutoff = datetime.utcnow() - timedelta(seconds=Config.YOUTUBE_METADATA_TTL_SECONDS)
+        for start in range(0, len(video_ids), 1000):
+            cached = VideoMetadata.query.filter(
+                VideoMetadata.video_id.in_(video_ids[start:start + 1000]),
+                VideoMetadata.fetched_at >= cutoff
+            ).all()
+            metadata.update((row.video_id, row.to_dict()) for row in cached)
     except Exception as e:
-        print(f"Error getting video title: {str(e)}")
-        return f"Unknown Title ({video_id})"
+        print(f"Warning: Video metadata cache unavailable: {str(e)}")
+        db.session.rollback()
+    
+    missing = [video_id for video_id in video_ids if video_id not in metadata]
+    if missing:
+        fetched = fetch_video_metadata(missing)
+        try:
+            store_video_metadata(fetched)
+        except Exception as e:
+            print(f"Warning: Failed to cache video metadata: {str(e)}")
+            db.session.rollback()
+        metadata.update((video_id, VideoMetadata(**entry).to_dict()) for video_id, entry in fetched.items())
+    
+    return metadata
 
-def get_transcript(video_id):
-    """Get transcript for a YouTube video"""
+def get_video_titles(video_ids):
+    """Titles for many videos, with a placeholder for any YouTube doesn't know"""
+    metadata = get_video_metadata(video_ids)
+    return {
+        video_id: (metadata.get(video_id) or {}).get('title') or f"Unknown Title ({video_id})"
+        for video_id in video_ids
+    }
+
+def get_video_title(video_id):
+    """Gets the title of a YouTube video using its ID"""
+    return get_video_titles([video_id])[video_id]
+
+def fetch_transcript_text(video_id):
+    transcript_list = YouTubeTranscriptApi.get_transcript(video_id)
+    return "".join(entry['text'] + "\n" for entry in transcript_list)
+
+def get_transcript(video_id, timeout=None):
+    """Get transcript for a YouTube video, giving up after timeout seconds.
+
+    The fetch runs on a shared pool so at most TRANSCRIPT_FETCH_CONCURRENCY
+    transcripts download at once across all worker threads. A running
+    fetch can't be cancelled, so timed-out ones are tracked until they
+    return, and new fetches are refused while too many are stalled.
+    """
+    timeout = timeout if timeout is not None else Config.TRANSCRIPT_FETCH_TIMEOUT_SECONDS
+    
+    with stalled_fetches_lock:
+        stalled = len(stalled_fetches)
+    if stalled >= Config.TRANSCRIPT_FETCH_MAX_STALLED:
+        return {"success": False, "transcript": "", "error": f"{stalled} earlier transcript fetches are still stalled, try again later"}
+    
+    future = transcript_executor.submit(fetch_transcript_text, video_id)
+    
     try:
-        transcript_list = YouTubeTranscriptApi.get_transcript(video_id)
-        
-        raw_transcript = ""
-        for entry in transcript_list:
-            raw_transcript += entry['text'] + "\n"
-            
-        return {"success": True, "transcript": raw_transcript}
+        return {"success": True, "transcript": future.result(timeout=timeout)}
+    
+    except FuturesTimeoutError:
+        if not future.cancel():
+            with stalled_fetches_lock:
+                stalled_fetches.add(future)
+            future.add_done_callback(release_stalled_fetch)
+        return {"success": False, "transcript": "", "error": f"Timed out after {timeout}s fetching transcript"}
     
     except Exception as e:
-        return {"success": False, "transcript": "", "error": str(e)}
\ No newline at end of file
+        return {"success": False, "transcript": "", "error": str(e)}
@@ -0,0 +1,23 @@
+export type JobStatus = 'queued' | 'running' | 'completed' | 'failed' | 'cancelled';
+
+export interface Job {
+  id: number;
+  job_type: 'extract' | 'clean' | 'index' | 'embed' | 'backfill_index';
+  video_id?: string;
+  status: JobStatus;
+  attempts: number;
+  max_attempts: number;
+  cancel_requested: boolean;
+  result?: any;
+  error_message?: string;
+  started_at?: string;
+  finished_at?: string;
+  created_at: string;
+  updated_at: string;
+}
+
+export interface JobResponse {
+  success: boolean;
+  job: Job;
+  message?: string;
+}
@@ -21,7 +21,9 @@ export interface ProcessedMatch {
 export interface MatchesResponse {
   success: boolean;
   matches: ProcessedMatch[];
-  total: number;
+  total: number | null;
+  next_cursor?: string | null;
+  has_more?: boolean;
   message?: string;
 }
 
@@ -1,8 +1,13 @@
 import { Injectable } from '@angular/core';
-import { Observable, BehaviorSubject } from 'rxjs';
+import { Observable, BehaviorSubject, timer } from 'rxjs';
+import { first, map, switchMap } from 'rxjs/operators';
 import { ApiService } from './api.service';
 import { UploadRequest, UploadResponse } from '../models/upload.interface';
 import { ProcessingStep } from '../models/processing-step.interface';
+import { Job, JobResponse } from '../models/job.interface';
+
+const JOB_POLL_INTERVAL_MS = 2000;
+const FINISHED_JOB_STATUSES = ['completed', 'failed', 'cancelled'];
 
 @Injectable({
   providedIn: 'root'
@@ -23,17 +28,45 @@ export class UploadService {
 
   extractTranscript(request: UploadRequest): Observable<any> {
     this.updateProcessingStep(1, 4, 'Extracting transcript...', 'processing');
-    return this.apiService.post('transcript/extract', request);
+    return this.apiService.post('transcript/extract', request).pipe(
+      switchMap((response: any) => this.waitForJob(response))
+    );
   }
 
   cleanTranscript(videoId: string): Observable<any> {
     this.updateProcessingStep(2, 4, 'Cleaning transcript with AI...', 'processing');
-    return this.apiService.post(`transcript/clean/${videoId}`, {});
+    return this.apiService.post(`transcript/clean/${videoId}`, {}).pipe(
+      switchMap((response: any) => this.waitForJob(response))
+    );
   }
 
   indexTranscript(videoId: string): Observable<any> {
     this.updateProcessingStep(3, 4, 'Indexing for search...', 'processing');
-    return this.apiService.post(`search/index/${videoId}`, {});
+    return this.apiService.post(`search/index/${videoId}`, {}).pipe(
+      switchMap((response: any) => this.waitForJob(response))
+    );
+  }
+
+  // The API queues long-running work and answers with a job id; poll until the worker finishes it
+  waitForJob(response: any): Observable<any> {
+    if (!response?.success || !response.job_id) {
+      return new Observable(observer => {
+        observer.next(response);
+        observer.complete();
+      });
+    }
+
+    return timer(0, JOB_POLL_INTERVAL_MS).pipe(
+      switchMap(() => this.apiService.get<Job>(`jobs/${response.job_id}`)),
+      map(jobResponse => (jobResponse as unknown as JobResponse).job),
+      first(job => FINISHED_JOB_STATUSES.includes(job.status)),
+      map(job => {
+        if (job.status !== 'completed') {
+          throw { success: false, message: job.error_message || `Job ${job.status}` };
+        }
+        return { ...response, ...(job.result || {}), success: true };
+      })
+    );
   }
 
   processVideo(input: string): Observable<UploadResponse> {
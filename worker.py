@@ -0,0 +1,228 @@
+import argparse
+import signal
+import threading
+import time
+import traceback
+
+from app import app
+from azure_tennis_api.config import Config
+from azure_tennis_api.models import db, JobStatus, ProcessingStatus
+from azure_tennis_api.services.job_queue_service import (
+    JobCancelled,
+    claim_next_job,
+    complete_job,
+    default_worker_id,
+    enqueue_job,
+    fail_job,
+    heartbeat_job,
+    mark_job_cancelled,
+    requeue_stale_jobs
+)
+from azure_tennis_api.services.match_stats_service import reconcile_match_stats
+from azure_tennis_api.services.processing_service import (
+    backfill_search_index,
+    clean_video,
+    embed_video,
+    extract_video,
+    index_video,
+    update_match_status
+)
+
+# How often a worker looks for jobs abandoned by a crashed node
+STALE_CHECK_INTERVAL_SECONDS = 60
+
+def run_extract_job(job, cancel_check):
+    return extract_video(job.video_id, (job.payload or {}).get('title'))
+
+def run_clean_job(job, cancel_check):
+    return clean_video(job.video_id, cancel_check=cancel_check)
+
+def run_index_job(job, cancel_check):
+    return index_video(job.video_id)
+
+def run_embed_job(job, cancel_check):
+    return embed_video(job.video_id)
+
+def run_backfill_index_job(job, cancel_check):
+    return backfill_search_index((job.payload or {}).get('limit'), cancel_check=cancel_check)
+
+# Stages whose final failure leaves the match failed, as the old synchronous routes did
+MATCH_STAGES = ('extract', 'clean')
+
+JOB_HANDLERS = {
+    'extract': run_extract_job,
+    'clean': run_clean_job,
+    'index': run_index_job,
+    'embed': run_embed_job,
+    'backfill_index': run_backfill_index_job
+}
+
+class JobHeartbeat(threading.Thread):
+    """Renews a job's lease from a side thread for as long as its handler runs.
+
+    Every job type heartbeats, including ones that never call cancel_check.
+    A cancel request or a lost lease is remembered and raised as
+    JobCancelled the next time the handler calls check().
+    """
+
+    def __init__(self, job_id, worker_id):
+        super().__init__(name=f"heartbeat-{job_id}", daemon=True)
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.stopped = threading.Event()
+        self.cancelled = None
+
+    def run(self):
+        with app.app_context():
+            try:
+                while not self.stopped.wait(Config.JOB_HEARTBEAT_SECONDS):
+                    try:
+                        heartbeat_job(self.job_id, self.worker_id)
+                    except JobCancelled as e:
+                        self.cancelled = e
+                        return
+                    except Exception:
+                        traceback.print_exc()
+                        db.session.rollback()
+            finally:
+                db.session.remove()
+
+    def check(self):
+        if self.cancelled:
+            raise JobCancelled(str(self.cancelled))
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+class Worker:
+    def __init__(self, worker_id=None, job_types=None, poll_interval=None, housekeeping=True):
+        self.worker_id = worker_id or default_worker_id()
+        self.job_types = job_types
+        self.poll_interval = poll_interval if poll_interval is not None else Config.JOB_POLL_INTERVAL_SECONDS
+        # Only one thread per process needs to requeue stale jobs and reconcile stats
+        self.housekeeping = housekeeping
+        self.stopping = False
+        self.last_stale_check = 0
+        self.last_stats_reconcile = 0
+
+    def stop(self, *args):
+        print(f"🛑 Worker {self.worker_id} stopping after the current job...")
+        self.stopping = True
+
+    def run(self, once=False):
+        print(f"👷 Worker {self.worker_id} started (job types: {self.job_types or 'all'})")
+
+        while not self.stopping:
+            if self.housekeeping and time.time() - self.last_stale_check > STALE_CHECK_INTERVAL_SECONDS:
+                requeue_stale_jobs()
+                self.last_stale_check = time.time()
+
+            if self.housekeeping and time.time() - self.last_stats_reconcile > Config.STATS_RECONCILE_INTERVAL_SECONDS:
+                try:
+                    reconcile_match_stats()
+                except Exception:
+                    traceback.print_exc()
+                self.last_stats_reconcile = time.time()
+
+            job = claim_next_job(self.worker_id, self.job_types)
+
+            if job:
+                self.execute(job)
+            elif once:
+                break
+            else:
+                time.sleep(self.poll_interval)
+
+    def execute(self, job):
+        job_id = job.id
+        video_id = job.video_id
+        then = (job.payload or {}).get('then', [])
+        handler = JOB_HANDLERS.get(job.job_type)
+
+        print(f"▶️ Running {job.job_type} job {job_id} for {video_id} (attempt {job.attempts})")
+
+        if not handler:
+            fail_job(job_id, self.worker_id, f"Unknown job type: {job.job_type}")
+            return
+
+        heartbeat = JobHeartbeat(job_id, self.worker_id)
+        heartbeat.start()
+        try:
+            result = handler(job, heartbeat.check)
+        except JobCancelled:
+            # Only a job we still own was cancelled; a lost lease means another worker has it now
+            if mark_job_cancelled(job_id, self.worker_id) and video_id:
+                update_match_status(video_id, ProcessingStatus.FAILED, "Processing cancelled")
+            return
+        except Exception as e:
+            traceback.print_exc()
+            self.fail(job_id, job.job_type, video_id, f"{type(e).__name__}: {str(e)}")
+            return
+        finally:
+            heartbeat.stop()
+
+        if result.get('success', False):
+            if complete_job(job_id, self.worker_id, result):
+                # Chain follow-up stages, e.g. reprocess = clean then index; an entry may be
+                # [job_type, then] when the next stage has follow-ups of its own
+                for next_stage in then:
+                    next_type, next_then = (next_stage, None) if isinstance(next_stage, str) else next_stage
+                    enqueue_job(next_type, video_id, {'then': next_then} if next_then else None)
+        else:
+            self.fail(job_id, job.job_type, video_id, result.get('error', 'Unknown error'), result)
+
+    def fail(self, job_id, job_type, video_id, error_message, result=None):
+        """Fail the job, and the match too once an extract or clean has no attempts left"""
+        job = fail_job(job_id, self.worker_id, error_message, result)
+        if job and job.status == JobStatus.FAILED and video_id and job_type in MATCH_STAGES:
+            update_match_status(video_id, ProcessingStatus.FAILED, error_message)
+
+def run_in_app_context(worker, once):
+    with app.app_context():
+        worker.run(once=once)
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a background worker for transcript jobs")
+    parser.add_argument('--worker-id', help="Identifier recorded on claimed jobs (default: host:pid)")
+    parser.add_argument('--types', help="Comma separated job types to handle (default: all)")
+    parser.add_argument('--poll-interval', type=float, help="Seconds to sleep when the queue is empty")
+    parser.add_argument('--concurrency', type=int, default=Config.WORKER_CONCURRENCY, help="Jobs to run at once in this process")
+    parser.add_argument('--once', action='store_true', help="Exit when the queue is empty")
+    args = parser.parse_args()
+
+    job_types = [t.strip() for t in args.types.split(',')] if args.types else None
+    worker_id = args.worker_id or default_worker_id()
+    concurrency = max(1, args.concurrency)
+
+    # Each thread claims its own jobs; SKIP LOCKED keeps them from colliding
+    workers = [
+        Worker(f"{worker_id}#{i}" if concurrency > 1 else worker_id, job_types, args.poll_interval, housekeeping=(i == 0))
+        for i in range(concurrency)
+    ]
+
+    def stop(*args):
+        for worker in workers:
+            worker.stop()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    if concurrency == 1:
+        run_in_app_context(workers[0], args.once)
+        return
+
+    threads = [
+        threading.Thread(target=run_in_app_context, args=(worker, args.once), name=worker.worker_id)
+        for worker in workers
+    ]
+    for thread in threads:
+        thread.start()
+
+    # Join with a timeout so the main thread keeps handling signals
+    while any(thread.is_alive() for thread in threads):
+        for thread in threads:
+            thread.join(0.5)
+
+if __name__ == '__main__':
+    main()